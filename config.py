@@ -15,4 +15,32 @@ GCS_BUCKET_NAME = "nick-storage"
 WORKSPACE_DIR = r"C:\Storage\Workspace\Nyra-AI-Studio"
 
 # --- Authentication Configuration ---
-SERVICE_ACCOUNT_KEY_PATH = os.path.join(WORKSPACE_DIR, r"auth\nick-466006-6fb113bb2d1f.json")
\ No newline at end of file
+SERVICE_ACCOUNT_KEY_PATH = os.path.join(WORKSPACE_DIR, r"auth\nick-466006-6fb113bb2d1f.json")
+
+# --- Orchestration Configuration ---
+# Upper bound for the prompt tokens re-sent on each orchestration turn (see tools/chat_history.py).
+CHAT_HISTORY_TOKEN_BUDGET = 32000
+# Tool outputs longer than this are truncated (head and tail kept) before entering the chat history.
+CHAT_TOOL_OUTPUT_MAX_CHARS = 4000
+
+# --- Local Cache Configuration ---
+# Indexes and content-addressed stores (GCS upload index, generation caches) live here.
+CACHE_DIR = os.path.join(WORKSPACE_DIR, ".nyra_cache")
+# Size bound for cached generate_image results (least recently used results are evicted first).
+IMAGE_CACHE_MAX_BYTES = 2 * 1024**3
+# Size bound for cached generate_speech results.
+SPEECH_CACHE_MAX_BYTES = 256 * 1024**2
+
+# --- Reference Image Transport ---
+# Reference images up to this size are sent inline with the request; larger ones are uploaded to GCS.
+INLINE_IMAGE_MAX_BYTES = 2 * 1024 * 1024
+# Size bound for resized/re-encoded reference images (see tools/_image_preprocess.py).
+REFERENCE_CACHE_MAX_BYTES = 512 * 1024**2
+
+# --- Music Generation ---
+# (connect, read) timeouts for Lyria REST calls; the read timeout covers the whole generation.
+LYRIA_TIMEOUT_SECONDS = (10, 300)
+
+# --- Video Assembly ---
+# Parallel ffmpeg encoders used by compile_final_video when clips must be re-encoded (None: cores // 4, at most 8).
+VIDEO_ENCODE_WORKERS = None
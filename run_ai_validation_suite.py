@@ -5,8 +5,6 @@
 #
 import os
 import sys
-import json
-import time
 
 # --- Path and Authentication Setup ---
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
@@ -17,6 +15,7 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 from google.genai import types as genai_types
 from tools import tool_schemas
+from tools.agent_runtime import AgentRuntime
 from tools.models import MODELS
 
 # --- AUTOMATED TEST SCRIPT ---
@@ -62,53 +61,12 @@ def run_automated_chat_test():
 
     # Initialize Chat History with the new, detailed system prompt
     chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "Understood. I have the list of valid models and will follow all instructions."}]}]
+    runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, tool_schemas.TOOL_REGISTRY, chat_history, speaker="AI", user_label="USER PROMPT")
 
     for i, prompt in enumerate(AUTOMATED_PROMPTS):
         print("\n" + "="*50)
         print(f"--- Step {i+1}/{len(AUTOMATED_PROMPTS)} ---")
-        print(f"\033[92m[USER PROMPT] > {prompt}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
-
-        while True:
-            response = client.models.generate_content(
-                model="gemini-2.5-pro",
-                contents=chat_history,
-                config=config_params
-            )
-            
-            part = response.candidates[0].content.parts[0]
-
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[AI RESPONSE] > {final_text}\033[0m")
-                break
-            
-            call = part.function_call
-            tool_name = call.name
-            tool_args = dict(call.args)
-            
-            print(f"\033[93m[AI ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            
-            chat_history.append({'role': 'model', 'parts': [part]})
-            
-            try:
-                tool_function = tool_schemas.TOOL_REGISTRY[tool_name]
-                tool_result = tool_function(**tool_args)
-                
-                chat_history.append({
-                    'role': 'user',
-                    'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(tool_result)}))]
-                })
-                print(f"\033[94m[TOOL RESULT] > {tool_result}\033[0m")
-            except Exception as e:
-                print(f"\033[91m[TOOL ERROR] > Execution failed for {tool_name}: {e}\033[0m")
-                chat_history.append({
-                    'role': 'user',
-                    'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': str(e)}))]
-                })
-
-        time.sleep(2)
+        if runtime.execute_turn(prompt) == "STOP": return
 
     print("\n" + "="*50)
     print("--- Automated Validation Suite Complete ---")
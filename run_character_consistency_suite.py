@@ -4,8 +4,6 @@
 #
 import os
 import sys
-import json
-import time
 
 # --- Path and Authentication Setup ---
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
@@ -16,6 +14,7 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 from google.genai import types as genai_types
 from tools import tool_schemas
+from tools.agent_runtime import AgentRuntime
 from tools.nyra_system_tools import delete_file
 
 # --- THE CONSISTENCY TEST SEQUENCE ---
@@ -26,11 +25,14 @@ CONSISTENCY_PROMPT_SEQUENCE = [
     # Phase 1, Step 2: Generate the Master Reference Image
     ("Create Reference Image", "Now, read the CIP from 'kaelen_cip.txt'. Using that prompt, generate the master reference image. The image should be a photorealistic, full-body shot of Kaelen in a neutral T-pose against a plain white background with flat, even lighting. Save it as 'output/consistency_test/kaelen_master_ref.png' using the 'imagen-4.0-generate-preview-06-06' model and a '9:16' aspect ratio."),
 
+    # Phase 1, Step 3: Register the Digital Twin so panels reuse the prepared references
+    ("Register Character", "Register Kaelen as a character with character_id 'kaelen', using the master reference image 'output/consistency_test/kaelen_master_ref.png' and the CIP file 'output/consistency_test/kaelen_cip.txt'."),
+
     # Phase 2, Step 1: Create Storyboard Panel 1 (Background Swap)
-    ("Panel 1: Scene Setting", "Excellent. Now create the first storyboard panel. Take the master reference image at 'output/consistency_test/kaelen_master_ref.png' and place Kaelen inside the cockpit of a dimly lit starship. The background should show stars streaming by a large viewport. Use the 'bgswap' edit mode and save the result as 'output/consistency_test/panel_01.png'."),
+    ("Panel 1: Scene Setting", "Excellent. Now create the first storyboard panel. Using character_id 'kaelen', place Kaelen inside the cockpit of a dimly lit starship. The background should show stars streaming by a large viewport. Use the 'bgswap' edit mode and save the result as 'output/consistency_test/panel_01.png'."),
 
     # Phase 2, Step 2: Create Storyboard Panel 2 (Pose/Action Change)
-    ("Panel 2: Action Pose", "For the second panel, let's change his pose. Using the master reference image at 'output/consistency_test/kaelen_master_ref.png' as the `subject_ref_path`, generate an image of Kaelen looking worried and pointing at a flashing red alert on a console. Use the 'subject' edit mode for this. Save the result as 'output/consistency_test/panel_02.png'."),
+    ("Panel 2: Action Pose", "For the second panel, let's change his pose. Using character_id 'kaelen', generate an image of Kaelen looking worried and pointing at a flashing red alert on a console. Use the 'subject' edit mode for this. Save the result as 'output/consistency_test/panel_02.png'."),
 
     # Phase 3: Verification
     ("Verification", "Perfect. The sequence is complete. As a final check, please list all the files in our 'output/consistency_test' directory.")
@@ -41,10 +43,11 @@ You are Nyra, an AI Creative Director specializing in visual consistency.
 
 Your instructions are absolute:
 1.  **Digital Twin First:** Your primary workflow is to first establish a character's identity (their Core Identity Prompt and Master Reference Image).
-2.  **Use the Anchor:** You will then use this Master Reference Image as the anchor for all subsequent image generations for that character.
+2.  **Use the Anchor:** You will then register the character with `register_character` and pass its `character_id` to every subsequent image or video generation for that character.
 3.  **Select the Right Tool:**
     * To place the character in a new scene, use the `edit_image` tool with `edit_mode='bgswap'`.
-    * To change the character's pose or expression, use the `edit_image` tool with `edit_mode='subject'`, providing the master reference as the `subject_ref_path`.
+    * To change the character's pose or expression, use the `edit_image` tool with `edit_mode='subject'` and the character's `character_id`.
+    * When several independent panels are needed at once, use `batch_edit_images` so they are rendered concurrently in one call.
 4.  **Acknowledge Failure:** If any tool fails, you MUST report the failure and STOP. Do not proceed.
 """
 
@@ -63,41 +66,12 @@ def run_consistency_suite():
         print(f"\nFATAL ERROR: Could not initialize: {e}"); return
 
     chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "INSTRUCTIONS UNDERSTOOD. I will follow the Digital Twin workflow to ensure character consistency."}]}]
+    runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, tool_schemas.TOOL_REGISTRY, chat_history)
 
     for i, (desc, prompt) in enumerate(CONSISTENCY_PROMPT_SEQUENCE):
         print("\n" + "="*70)
         print(f"--- Running Step {i+1}/{len(CONSISTENCY_PROMPT_SEQUENCE)}: {desc} ---")
-        print(f"\033[92m[DIRECTOR] > {prompt}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
-
-        while True:
-            response = client.models.generate_content(model="gemini-2.5-pro", contents=chat_history, config=config_params)
-            
-            if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
-                print(f"\033[91m[API ERROR] > Model returned an empty or blocked response.\033[0m"); return
-
-            part = response.candidates[0].content.parts[0]
-
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[NYRA] > {final_text}\033[0m")
-                break
-            
-            call = part.function_call; tool_name = call.name; tool_args = dict(call.args)
-            print(f"\033[93m[NYRA ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            chat_history.append({'role': 'model', 'parts': [part]})
-            
-            try:
-                tool_function = tool_schemas.TOOL_REGISTRY[tool_name]
-                tool_result = tool_function(**tool_args)
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(tool_result)}))]})
-                print(f"\033[94m[TOOL RESULT] > {tool_result}\033[0m")
-            except Exception as e:
-                error_str = str(e)
-                print(f"\033[91m[TOOL ERROR] > {error_str}\033[0m")
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': error_str}))]})
-        time.sleep(2)
+        if runtime.execute_turn(prompt) == "STOP": return
 
     # Cleanup
     print("\n" + "="*70)
@@ -7,12 +7,11 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # ---
 
-import json
-import time
 import config
 from google import genai
 import google.genai.types as genai_types
 from tools.tool_loader import ALL_TOOLS_SCHEMA, TOOL_REGISTRY
+from tools.agent_runtime import AgentRuntime
 from tools.nyra_system_tools import make_directory
 
 # --- DYNAMIC ASSET PATHS ---
@@ -26,7 +25,7 @@ CHARACTER_CIP = "A photorealistic 3D cartoon character 'Alina', in the style of
 # --- DEFINITIVE CONTROLNET TEST SEQUENCE ---
 CONTROLNET_PROMPTS = [
     # 1. Generate the pose reference image using Imagen 3.
-    ("Generate Pose Reference", f"Generate a full-body, photorealistic image of a generic, androgynous person standing and giving a clear thumbs-up with their right hand. The background must be a solid, uncluttered, light gray. Use the 'imagen-3.0-generate-002' model. Save it to '{POSE_REFERENCE_IMAGE_PATH}'."),
+    ("Generate Pose Reference", f"Generate a full-body, photorealistic image of a generic, androgynous person standing and giving a clear thumbs-up with their right hand. The background must be a solid, uncluttered, light gray. Use the 'imagen-3.0-generate-002' model with seed 1234. Save it to '{POSE_REFERENCE_IMAGE_PATH}'."),
 
     # 2. Extract the skeleton from the newly generated pose reference.
     ("Extract Pose Skeleton", f"Analyze the pose reference image at '{POSE_REFERENCE_IMAGE_PATH}' and extract its OpenPose skeleton. Save the skeleton image to '{SKELETON_IMAGE_PATH}'."),
@@ -51,42 +50,16 @@ def run_controlnet_test():
         print(f"\nFATAL ERROR: Could not initialize: {e}"); return
         
     chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "RULES UNDERSTOOD. I will use cost-effective models and the ControlNet workflow."}]}]
+    runtime = AgentRuntime(client, "gemini-2.5-flash", config_params, TOOL_REGISTRY, chat_history)
     
     for i, (desc, prompt) in enumerate(CONTROLNET_PROMPTS):
         print("\n" + "="*70)
         print(f"--- Running Step {i+1}/{len(CONTROLNET_PROMPTS)}: {desc} ---")
-        print(f"\033[92m[DIRECTOR] > {prompt}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
-        
-        last_tool_result = None
-        while True:
-            # DEFINITIVE CHANGE: Using the cheaper gemini-2.5-flash model for orchestration.
-            response = client.models.generate_content(model="gemini-2.5-flash", contents=chat_history, config=config_params)
-            
-            if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
-                print(f"\033[91m[API ERROR] > Model returned an empty or blocked response.\033[0m"); return
-            part = response.candidates[0].content.parts[0]
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[NYRA] > {final_text}\033[0m")
-                if "OPERATION FAILED" in final_text: print("\n--- WORKFLOW HALTED ---"); return
-                break
-            call = part.function_call; tool_name = call.name; tool_args = dict(call.args)
-            print(f"\033[93m[NYRA ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            chat_history.append({'role': 'model', 'parts': [part]})
-            try:
-                tool_function = TOOL_REGISTRY[tool_name]
-                last_tool_result = tool_function(**tool_args)
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(last_tool_result)}))]})
-                print(f"\033[94m[TOOL RESULT] > {last_tool_result}\033[0m")
-            except Exception as e:
-                error_str = str(e); last_tool_result = f"Error: {error_str}"
-                print(f"\033[91m[TOOL ERROR] > {error_str}\033[0m")
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': str(e)}))]})
-        if last_tool_result is None or "Failed" in str(last_tool_result):
+        final_text = runtime.execute_turn(prompt)
+        if final_text == "STOP": return
+        if "OPERATION FAILED" in final_text: print("\n--- WORKFLOW HALTED ---"); return
+        if not runtime.last_tool_results or any(r is None or "Failed" in str(r) for r in runtime.last_tool_results):
              print("\n--- WORKFLOW HALTED ---"); return
-        time.sleep(2)
         
     print("\n" + "="*70)
     print("--- ControlNet Pose Consistency Workflow Complete ---")
@@ -1,10 +1,12 @@
 # run_full_production.py
-# Definitive Version 3.3: Corrects a NameError in the audio generation loop.
+# Version 4.1: Adds a direct executor mode that drives the tools from the plan without LLM turns.
+# Version 4.2: Journals every completed node so a crashed run can be resumed with --resume / --from-shot.
 #
 import os
 import sys
 import json
-import time
+import asyncio
+import argparse
 
 # --- Path and Authentication Setup ---
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
@@ -15,7 +17,10 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 from google.genai import types as genai_types
 from tools import tool_schemas
-from tools.nyra_system_tools import resolve_path_in_workspace
+from tools.agent_runtime import AgentRuntime
+from tools.production_scheduler import build_production_graph, make_direct_runner, ProductionScheduler
+from tools.production_journal import ProductionJournal, hash_inputs
+from tools._helpers import resolve_path_in_workspace
 
 # --- The High-Level Idea for a 2-Minute Film ---
 FILM_PROMPT = """
@@ -41,113 +46,114 @@ Your instructions are absolute:
 4.  **Follow the Plan:** Your first step is to create a Production Plan. After that, you will execute that plan shot-by-shot as prompted by the user.
 """
 
-def run_production():
+PROJECT_DIR = "output/antariksh_ka_phool"
+ACK_TEXT = "INSTRUCTIONS UNDERSTOOD. I will execute directives autonomously, use default parameters without confirmation, and report all failures accurately."
+
+def _new_chat_history():
+    return [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": ACK_TEXT}]}]
+
+def _node_prompt(node) -> str:
+    """Builds the DIRECTOR prompt that asks Nyra to execute one production node."""
+    p = node.params
+    if node.kind == "video" and node.node_id.endswith("_base"):
+        return f"Generate the FIRST PART of Shot {p['shot_number']}: '{p['video_prompt']}'. Duration: {p['duration_seconds']}s. Model: '{p['model_name']}'. Save to '{p['output_path']}'."
+    if node.kind == "video":
+        return f"Generate video for Shot {p['shot_number']}: '{p['video_prompt']}'. Duration: {p['duration_seconds']}s. Model: '{p['model_name']}'. Save to '{p['output_path']}'."
+    if node.kind == "extend":
+        return f"Now, EXTEND the video for Shot {p['shot_number']} at '{p['input_path']}' to create the final clip. The extension prompt is '{p['prompt']}'. Save the final extended clip as '{p['output_path']}'."
+    if node.kind == "audio" and p['layer_type'] == "DIALOGUE":
+        return f"Generate DIALOGUE for Shot {p['shot_number']}: '{p['prompt']}'. Voice: '{p['voice_name']}'. Save to '{p['output_path']}'."
+    if node.kind == "audio":
+        return f"Generate {p['layer_type']} for Shot {p['shot_number']} with the music tool: '{p['prompt']}'. Save to '{p['output_path']}'."
+    return f"All assets are generated. Compile these video clips: {p['video_clip_paths']} with these audio clips in order: {p['audio_clip_paths']}, using these transitions between the clips: {p.get('transitions') or []}. Save the result as '{p['output_path']}'."
+
+async def run_production_async(mode: str = "direct", resume: bool = False, from_shot: int = None):
     """
     Orchestrates the entire production workflow using a strategic two-step planning process.
+    In 'direct' mode the plan is created and rendered by calling the tools straight from the
+    ProductionPlan fields; the LLM is only used inside create_production_plan. In 'agent' mode
+    every step is a DIRECTOR prompt, with one short-lived chat per node so concurrent nodes
+    never share a history.
+    With `resume` (implied by `from_shot`), nodes recorded in the project journal whose outputs
+    are intact are skipped; `from_shot` re-renders shot N onwards and the final compile.
     """
-    print("--- Nyra AI Studio: Strategic Film Production Initialized ---")
-    try:
-        client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
-        config_params = genai_types.GenerateContentConfig(tools=[tool_schemas.ALL_TOOLS_SCHEMA])
-    except Exception as e:
-        print(f"\nFATAL ERROR: Could not initialize: {e}"); return
-
-    chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "INSTRUCTIONS UNDERSTOOD. I will execute directives autonomously, use default parameters without confirmation, and report all failures accurately."}]}]
-
-    def execute_turn(prompt_text: str):
-        # This function remains the same as before...
-        print("\n" + "="*70)
-        print(f"\033[92m[DIRECTOR] > {prompt_text}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt_text}]})
-        
-        while True:
-            response = client.models.generate_content(model="gemini-2.5-pro", contents=chat_history, config=config_params)
-            
-            if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
-                print(f"\033[91m[API ERROR] > Model returned an empty or blocked response. Aborting production.\033[0m")
-                if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                    print(f"   -> Prompt Feedback: {response.prompt_feedback}")
-                if hasattr(response, 'candidates') and response.candidates and hasattr(response.candidates[0], 'finish_reason'):
-                    print(f"   -> Finish Reason: {response.candidates[0].finish_reason.name}")
-                return "STOP"
-
-            part = response.candidates[0].content.parts[0]
-
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[NYRA] > {final_text}\033[0m")
-                return final_text
-            
-            call = part.function_call; tool_name = call.name; tool_args = dict(call.args)
-            print(f"\033[93m[NYRA ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            chat_history.append({'role': 'model', 'parts': [part]})
-            
-            try:
-                tool_function = tool_schemas.TOOL_REGISTRY[tool_name]
-                tool_result = tool_function(**tool_args)
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(tool_result)}))]})
-                print(f"\033[94m[TOOL RESULT] > {tool_result}\033[0m")
-            except Exception as e:
-                error_str = str(e)
-                print(f"\033[91m[TOOL ERROR] > {error_str}\033[0m")
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': error_str}))]})
-        time.sleep(2)
-
-    # --- PRODUCTION EXECUTION ---
-    if execute_turn("Let's create the project directory 'output/antariksh_ka_phool'.") == "STOP": return
-    plan_path = "output/antariksh_ka_phool/production_plan.json"
-    if execute_turn(f"The film concept is: '{FILM_PROMPT}'. Create the detailed production plan and save it to '{plan_path}'.") == "STOP": return
+    print(f"--- Nyra AI Studio: Strategic Film Production Initialized (mode: {mode}) ---")
+    plan_path = f"{PROJECT_DIR}/production_plan.json"
+    resume = resume or from_shot is not None
+    journal = ProductionJournal(PROJECT_DIR, resume=resume)
+    plan_hash = hash_inputs({"film_prompt": FILM_PROMPT})
+
+    if mode == "agent":
+        try:
+            client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
+            config_params = genai_types.GenerateContentConfig(tools=[tool_schemas.ALL_TOOLS_SCHEMA])
+        except Exception as e:
+            print(f"\nFATAL ERROR: Could not initialize: {e}"); return
+
+    # --- PLANNING ---
+    plan_reused = journal.is_valid("plan", plan_hash)
+    if not plan_reused:
+        # A plan left over from an earlier run must never stand in for one this run failed to create.
+        resolve_path_in_workspace(plan_path).unlink(missing_ok=True)
+    if plan_reused:
+        print(f"-> Journal: reusing the production plan at '{plan_path}'.")
+    elif mode == "direct":
+        journal.record_start("plan", plan_hash)
+        tool_schemas.TOOL_REGISTRY["make_directory"](PROJECT_DIR)
+        result = await asyncio.to_thread(tool_schemas.TOOL_REGISTRY["create_production_plan"], FILM_PROMPT, plan_path)
+        if result is None or str(result).startswith("Failed"):
+            journal.record_failed("plan", plan_hash, str(result))
+            print(f"CRITICAL FAILURE: {result} Aborting production."); return
+    else:
+        journal.record_start("plan", plan_hash)
+        runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, tool_schemas.TOOL_REGISTRY, _new_chat_history())
+
+        async def execute_turn(prompt_text: str):
+            print("\n" + "="*70)
+            result = await runtime.execute_turn_async(prompt_text)
+            if result == "STOP":
+                print("\033[91m[API ERROR] > Aborting production.\033[0m")
+            return result
+
+        if await execute_turn(f"Let's create the project directory '{PROJECT_DIR}'.") == "STOP": return
+        if await execute_turn(f"The film concept is: '{FILM_PROMPT}'. Create the detailed production plan and save it to '{plan_path}'.") == "STOP": return
     
     if not os.path.exists(resolve_path_in_workspace(plan_path)):
+        journal.record_failed("plan", plan_hash, "plan was not created")
         print("CRITICAL FAILURE: Production Plan was not created. Aborting production."); return
+    if not plan_reused:
+        journal.record_done("plan", plan_hash, [plan_path])
 
     with open(resolve_path_in_workspace(plan_path), 'r', encoding='utf-8') as f:
         production_plan = json.load(f)
 
-    all_video_clips = []
-    all_audio_clips = []
-    for shot in production_plan['shots']:
-        shot_num = shot['shot_number']
-        video_prompt = shot['video_prompt']
-        strategy = shot['generation_strategy']
-        duration = shot['duration_seconds']
-        
-        output_clip_path = f"output/antariksh_ka_phool/shot_{shot_num:02d}.mp4"
-        
-        if strategy == "SINGLE_SHOT":
-            prompt = f"Generate video for Shot {shot_num}: '{video_prompt}'. Duration: {min(duration, 8)}s. Model: 'veo-2.0-generate-001'. Save to '{output_clip_path}'."
-            if execute_turn(prompt) == "STOP": return
-        elif strategy == "EXTEND_SHOT":
-            base_clip_path = f"output/antariksh_ka_phool/shot_{shot_num:02d}_base.mp4"
-            prompt1 = f"Generate the FIRST PART of Shot {shot_num}: '{video_prompt}'. Duration: 8s. Model: 'veo-2.0-generate-001'. Save to '{base_clip_path}'."
-            if execute_turn(prompt1) == "STOP": return
-            
-            prompt2 = f"Now, EXTEND the video for Shot {shot_num} at '{base_clip_path}' to create the final clip. The extension prompt is 'the astronaut continues his journey across the landscape'. Save the final extended clip as '{output_clip_path}'."
-            if execute_turn(prompt2) == "STOP": return
-        
-        all_video_clips.append(output_clip_path)
-
-        for i, layer in enumerate(shot['audio_layers']):
-            layer_type = layer['layer_type']
-            layer_prompt = layer['prompt']
-            audio_path = f"output/antariksh_ka_phool/shot_{shot_num:02d}_audio_{i+1}_{layer_type.lower()}.mp3"
-            
-            if layer_type == "DIALOGUE":
-                voice = layer.get('voice_name', 'hi-IN-Wavenet-D')
-                # DEFINITIVE FIX: Replaced 'shot_name' with the correct variable 'shot_num'.
-                audio_prompt = f"Generate DIALOGUE for Shot {shot_num}: '{layer_prompt}'. Voice: '{voice}'. Save to '{audio_path}'."
-                if execute_turn(audio_prompt) == "STOP": return
-            
-            all_audio_clips.append(audio_path)
-
-    if all_video_clips:
-        final_output_path = "output/antariksh_ka_phool/final_film.mp4"
-        compilation_prompt = f"All assets are generated. Compile these video clips: {all_video_clips} with these audio clips in order: {all_audio_clips}. Save the result as '{final_output_path}'."
-        if execute_turn(compilation_prompt) == "STOP": return
-    
+    # --- PRODUCTION EXECUTION ---
+    async def run_node_with_agent(node) -> bool:
+        node_runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, tool_schemas.TOOL_REGISTRY, _new_chat_history(), speaker=f"NYRA:{node.node_id}")
+        result = await node_runtime.execute_turn_async(_node_prompt(node))
+        if result == "STOP": return False
+        return bool(node_runtime.last_tool_results) and not any(r is None or "FAILED" in str(r).upper() or str(r).startswith("Error:") for r in node_runtime.last_tool_results)
+
+    run_node = make_direct_runner(tool_schemas.TOOL_REGISTRY) if mode == "direct" else run_node_with_agent
+    nodes = build_production_graph(production_plan, PROJECT_DIR)
+    if from_shot is not None:
+        journal.invalidate(n.node_id for n in nodes if n.kind == "compile" or n.params.get("shot_number", 0) >= from_shot)
+    print(f"-> Scheduling {len(nodes)} production nodes.")
+    status = await ProductionScheduler(nodes, journal.wrap_runner(run_node)).run_async()
+
     print("\n" + "="*70)
+    incomplete = {node_id: state for node_id, state in status.items() if state != "done"}
+    if incomplete:
+        print(f"\033[91m[PRODUCTION INCOMPLETE] > {incomplete}\033[0m"); return
     print("--- 'Antariksh ka Phool' STRATEGIC PRODUCTION COMPLETE ---")
 
+def run_production(mode: str = "direct", resume: bool = False, from_shot: int = None):
+    asyncio.run(run_production_async(mode, resume, from_shot))
+
 if __name__ == "__main__":
-    run_production()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Nyra AI Studio - Full Film Production")
+    parser.add_argument("--mode", default="direct", choices=["direct", "agent"], help="'direct' drives the tools from the plan; 'agent' routes every step through Gemini.")
+    parser.add_argument("--resume", action="store_true", help="Skip every node the project journal records as complete with intact outputs.")
+    parser.add_argument("--from-shot", type=int, metavar="N", help="Resume, but re-render shot N onwards and the final compile.")
+    args = parser.parse_args()
+    run_production(args.mode, args.resume, args.from_shot)
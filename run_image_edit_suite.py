@@ -5,8 +5,6 @@
 #
 import os
 import sys
-import json
-import time
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import config
@@ -15,6 +13,7 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 from google.genai import types as genai_types
 from tools import tool_schemas
+from tools.agent_runtime import AgentRuntime
 from tools.models import MODELS
 from tools.nyra_system_tools import make_directory, delete_file
 
@@ -54,41 +53,12 @@ def run_image_edit_test():
         print(f"\nFATAL ERROR: Could not initialize: {e}"); return
 
     chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "System context understood. I will adhere to all constraints."}]}]
+    runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, tool_schemas.TOOL_REGISTRY, chat_history, speaker="AI", user_label="USER PROMPT")
 
     for i, (desc, prompt) in enumerate(IMAGE_EDIT_PROMPTS):
         print("\n" + "="*70)
         print(f"--- Running Step {i+1}/{len(IMAGE_EDIT_PROMPTS)}: {desc} ---")
-        print(f"\033[92m[USER PROMPT] > {prompt}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
-
-        while True:
-            response = client.models.generate_content(model="gemini-2.5-pro", contents=chat_history, config=config_params)
-            part = response.candidates[0].content.parts[0]
-
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[AI RESPONSE] > {final_text}\033[0m")
-                break
-            
-            call = part.function_call
-            tool_name = call.name
-            tool_args = dict(call.args)
-            
-            print(f"\033[93m[AI ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            chat_history.append({'role': 'model', 'parts': [part]})
-            
-            try:
-                tool_function = tool_schemas.TOOL_REGISTRY[tool_name]
-                tool_result = tool_function(**tool_args)
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(tool_result)}))]})
-                print(f"\033[94m[TOOL RESULT] > {tool_result}\033[0m")
-            except Exception as e:
-                error_str = str(e)
-                print(f"\033[91m[TOOL ERROR] > {error_str}\033[0m")
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': error_str}))]})
-
-        time.sleep(2)
+        if runtime.execute_turn(prompt) == "STOP": return
 
     print("\n" + "="*70)
     print("--- Image Editing Test Suite Complete ---")
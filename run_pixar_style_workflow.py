@@ -3,8 +3,6 @@
 
 import os
 import sys
-import json
-import time
 
 # --- Suppress non-critical warnings for a cleaner output ---
 import warnings
@@ -21,6 +19,7 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 import google.genai.types as genai_types
 from tools.tool_loader import ALL_TOOLS_SCHEMA, TOOL_REGISTRY
+from tools.agent_runtime import AgentRuntime
 from tools.nyra_system_tools import make_directory
 
 # --- THE PIXAR-STYLE TEST SEQUENCE (using premium models) ---
@@ -60,41 +59,16 @@ def run_pixar_workflow():
     except Exception as e:
         print(f"\nFATAL ERROR: Could not initialize: {e}"); return
     chat_history = [{"role": "user", "parts": [{"text": SYSTEM_PROMPT}]}, {"role": "model", "parts": [{"text": "RULES UNDERSTOOD. I will call tools and respond with `FAILURE` if any tool fails."}]}]
+    runtime = AgentRuntime(client, "gemini-2.5-pro", config_params, TOOL_REGISTRY, chat_history)
 
     for i, (desc, prompt) in enumerate(PIXAR_STYLE_PROMPTS):
         print("\n" + "="*70)
         print(f"--- Running Step {i+1}/{len(PIXAR_STYLE_PROMPTS)}: {desc} ---")
-        print(f"\033[92m[DIRECTOR] > {prompt}\033[0m")
-        chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
-        
-        last_tool_result = None
-        while True:
-            response = client.models.generate_content(model="gemini-2.5-pro", contents=chat_history, config=config_params)
-            
-            if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
-                print(f"\033[91m[API ERROR] > Model returned an empty or blocked response.\033[0m"); return
-            part = response.candidates[0].content.parts[0]
-            if not hasattr(part, 'function_call') or not part.function_call:
-                final_text = part.text
-                chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
-                print(f"\033[96m[NYRA] > {final_text}\033[0m")
-                if "FAILURE" in final_text.upper(): print("\n--- WORKFLOW HALTED BY AI ---"); return
-                break
-            call = part.function_call; tool_name = call.name; tool_args = dict(call.args)
-            print(f"\033[93m[NYRA ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
-            chat_history.append({'role': 'model', 'parts': [part]})
-            try:
-                tool_function = TOOL_REGISTRY[tool_name]
-                last_tool_result = tool_function(**tool_args)
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': str(last_tool_result)}))]})
-                print(f"\033[94m[TOOL RESULT] > {last_tool_result}\033[0m")
-            except Exception as e:
-                error_str = str(e); last_tool_result = f"Error: {error_str}"
-                print(f"\033[91m[TOOL ERROR] > {error_str}\033[0m")
-                chat_history.append({'role': 'user', 'parts': [genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': error_str}))]})
-        if last_tool_result is None or "Failed" in str(last_tool_result) or "Error:" in str(last_tool_result):
+        final_text = runtime.execute_turn(prompt)
+        if final_text == "STOP": return
+        if "FAILURE" in final_text.upper(): print("\n--- WORKFLOW HALTED BY AI ---"); return
+        if not runtime.last_tool_results or any(r is None or "Failed" in str(r) or "Error:" in str(r) for r in runtime.last_tool_results):
              print("\n--- WORKFLOW HALTED DUE TO TOOL FAILURE ---"); return
-        time.sleep(2)
     print("\n" + "="*70)
     print("--- 'Pixar Style' Workflow Complete ---")
 
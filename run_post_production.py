@@ -4,7 +4,6 @@
 import os
 import sys
 import json
-import time
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 import config
@@ -13,6 +12,7 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 from google import genai
 from google.genai import types as genai_types
 from tools import tool_schemas
+from tools._rate_limit import call_with_retry
 
 # --- Test Setup ---
 VIDEO_CLIPS = ['output/final_film/shot_01.mp4', 'output/final_film/shot_02.mp4']
@@ -34,7 +34,8 @@ def run_post_prod_test():
     chat_history.append({'role': 'user', 'parts': [{'text': prompt}]})
     
     # CORRECTED: Added keyword arguments 'model=' and 'contents='
-    response = client.models.generate_content(
+    response = call_with_retry(
+        "gemini-2.5-pro", client.models.generate_content,
         model="gemini-2.5-pro",
         contents=chat_history,
         config=config_params
@@ -0,0 +1,142 @@
+# tools/_cache.py
+# A small content-addressed file cache under config.CACHE_DIR, shared by the generation tools.
+# Entries map a request key (a hash of the parameters that determine the output) to a stored
+# object named by the SHA-256 of its bytes, so identical results are stored once. The store is
+# bounded by total size and evicts least-recently-used entries. Hits are materialized into the
+# caller's output path by hard link when possible, falling back to a copy.
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+import config
+
+def make_cache_key(**fields) -> str:
+    """Stable key for a set of request parameters (enums and other objects are stringified)."""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class ContentCache:
+    """A size-bounded LRU file cache stored at <CACHE_DIR>/<name>."""
+    def __init__(self, name: str, max_bytes: int):
+        self.name = name
+        self.root = Path(config.CACHE_DIR) / name
+        self.index_path = self.root / "index.json"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._lock = threading.Lock()
+
+    # --- Index ---
+    def _entries(self) -> dict:
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._index), encoding='utf-8')
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, sha256: str, suffix: str) -> Path:
+        return self.root / "objects" / sha256[:2] / f"{sha256}{suffix}"
+
+    def _object_intact(self, entry: dict) -> bool:
+        # A hard-linked output that was later rewritten in place would change the shared object.
+        try:
+            st = os.stat(self._object_path(entry['sha256'], entry['suffix']))
+        except OSError:
+            return False
+        return st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime_ns']
+
+    def _hit(self, key: str) -> Path:
+        # Called with the lock held: validates the entry, records the hit or miss, returns the object path.
+        entry = self._entries().get(key)
+        if entry and not self._object_intact(entry):
+            del self._index[key]
+            if not any(e['sha256'] == entry['sha256'] for e in self._index.values()):
+                try:
+                    self._object_path(entry['sha256'], entry['suffix']).unlink()
+                except OSError:
+                    pass
+            self._save()
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        entry['last_used'] = time.time()
+        self.hits += 1
+        self._save()
+        return self._object_path(entry['sha256'], entry['suffix'])
+
+    # --- Public API ---
+    def get(self, key: str, output_path) -> str:
+        """Materializes a cached result at output_path. Returns the path on a hit, None on a miss."""
+        output_path = Path(output_path)
+        # Materialize under the lock, so a concurrent put cannot evict the object before it is linked.
+        with self._lock:
+            source = self._hit(key)
+            if source is None: return None
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            if output_path.exists():
+                if os.path.samefile(source, output_path): return str(output_path)
+                output_path.unlink()
+            try:
+                os.link(source, output_path)
+            except OSError:
+                shutil.copyfile(source, output_path)
+        return str(output_path)
+
+    def put(self, key: str, source_path, meta: dict = None) -> Path:
+        """Stores a copy of source_path under key, then evicts old entries beyond max_bytes. Returns the stored object's path."""
+        source_path = Path(source_path)
+        sha256 = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self._lock:
+            object_path = self._object_path(digest, source_path.suffix)
+            if not object_path.exists():
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = object_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                shutil.copyfile(source_path, tmp_path)
+                os.replace(tmp_path, object_path)
+            st = os.stat(object_path)
+            self._entries()[key] = {
+                "sha256": digest, "suffix": source_path.suffix, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                "created": time.time(), "last_used": time.time(), "meta": meta or {}
+            }
+            self._evict()
+            self._save()
+        return object_path
+
+    def _evict(self):
+        entries = self._index
+        objects = {}
+        for key, entry in entries.items():
+            objects.setdefault((entry['sha256'], entry['suffix']), []).append(key)
+        total = sum(entries[keys[0]]['size'] for keys in objects.values())
+        # Least recently used objects go first; an object shared by several keys goes with all of them.
+        for obj, keys in sorted(objects.items(), key=lambda item: max(entries[k]['last_used'] for k in item[1])):
+            if total <= self.max_bytes: break
+            total -= entries[keys[0]]['size']
+            for k in keys: del entries[k]
+            try:
+                self._object_path(*obj).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._entries()
+            size = sum({(e['sha256'], e['suffix']): e['size'] for e in entries.values()}.values())
+        total = self.hits + self.misses
+        return {"entries": len(entries), "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None}
@@ -1,7 +1,13 @@
 # tools/_helpers.py
 import os
 import sys
+import json
 import time
+import base64
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add the project root to the path to allow absolute imports
@@ -11,6 +17,72 @@ os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = config.SERVICE_ACCOUNT_KEY_PATH
 
 from google import genai
 from google.cloud import storage
+import requests
+
+# --- Process-wide client registry ---
+# Each SDK client is created once per process and shared by every tool, so TLS sessions,
+# HTTP connection pools and discovered credentials are reused across assets.
+CLIENT_POOL_MAXSIZE = 32
+_client_lock = threading.Lock()
+_clients = {}
+_client_stats = {}
+
+def _get_client(name: str, factory):
+    with _client_lock:
+        client = _clients.get(name)
+        if client is None:
+            started = time.perf_counter()
+            client = factory()
+            _clients[name] = client
+            _client_stats[name] = {"created_at": time.time(), "init_seconds": round(time.perf_counter() - started, 3), "acquisitions": 0}
+        _client_stats[name]["acquisitions"] += 1
+        return client
+
+def _create_storage_client():
+    storage_client = storage.Client(project=config.PROJECT_ID)
+    # Widen the urllib3 pool so concurrent uploads/downloads don't queue on the default 10 connections.
+    adapter = requests.adapters.HTTPAdapter(pool_connections=CLIENT_POOL_MAXSIZE, pool_maxsize=CLIENT_POOL_MAXSIZE)
+    storage_client._http.mount("https://", adapter)
+    return storage_client
+
+def _create_tts_client():
+    from google.cloud import texttospeech
+    return texttospeech.TextToSpeechClient()
+
+def _create_lyria_session():
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+    # AuthorizedSession refreshes the cached token only when it has expired (or on a 401),
+    # instead of a token round trip per request.
+    creds, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
+    session = AuthorizedSession(creds)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=CLIENT_POOL_MAXSIZE, pool_maxsize=CLIENT_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    return session
+
+def get_genai_client() -> genai.Client:
+    """Returns the shared Vertex AI genai client."""
+    return _get_client("genai", lambda: genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION))
+
+def get_storage_client() -> storage.Client:
+    """Returns the shared Cloud Storage client."""
+    return _get_client("storage", _create_storage_client)
+
+def get_tts_client():
+    """Returns the shared Text-to-Speech client."""
+    return _get_client("tts", _create_tts_client)
+
+def get_lyria_session():
+    """Returns the shared authorized HTTP session for REST-only models such as Lyria."""
+    return _get_client("lyria", _create_lyria_session)
+
+def get_client_pool_stats() -> dict:
+    """Reports which clients exist, how long each took to create, and how often it was reused."""
+    with _client_lock:
+        stats = {name: dict(values, reuses=values["acquisitions"] - 1) for name, values in _client_stats.items()}
+    if "storage" in _clients:
+        stats["storage"]["pool_maxsize"] = CLIENT_POOL_MAXSIZE
+    return stats
 
 def resolve_path_in_workspace(user_path: str) -> Path:
     """Resolves and validates a path within the workspace."""
@@ -21,43 +93,204 @@ def resolve_path_in_workspace(user_path: str) -> Path:
     target_path.parent.mkdir(parents=True, exist_ok=True)
     return target_path
 
+# --- Content-addressed upload index ---
+# Maps local files (by SHA-256, with an mtime/size fast path) to gs:// URIs that already hold the
+# same bytes, so a reference image reused across panels and I2V calls is uploaded only once.
+UPLOAD_INDEX_PATH = Path(config.CACHE_DIR) / "gcs_upload_index.json"
+_upload_index = None
+_upload_index_lock = threading.Lock()
+_upload_locks = defaultdict(threading.Lock)
+
+def _load_upload_index() -> dict:
+    global _upload_index
+    if _upload_index is None:
+        try:
+            _upload_index = json.loads(UPLOAD_INDEX_PATH.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            _upload_index = {"files": {}, "blobs": {}}
+    return _upload_index
+
+def _save_upload_index():
+    UPLOAD_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = UPLOAD_INDEX_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(_upload_index), encoding='utf-8')
+    os.replace(tmp_path, UPLOAD_INDEX_PATH)
+
+def file_digests(local_path: Path) -> tuple:
+    """Returns (sha256 hex, base64 MD5) for a file, reusing the index entry while mtime and size are unchanged."""
+    st = os.stat(local_path)
+    key = str(Path(local_path).resolve())
+    with _upload_index_lock:
+        entry = _load_upload_index()["files"].get(key)
+    if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+        return entry["sha256"], entry["md5"]
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(local_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk); md5.update(chunk)
+    digests = (sha256.hexdigest(), base64.b64encode(md5.digest()).decode('ascii'))
+    with _upload_index_lock:
+        _load_upload_index()["files"][key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digests[0], "md5": digests[1]}
+    return digests
+
+def _blob_matches(blob, md5: str) -> bool:
+    try:
+        blob.reload()
+    except Exception:
+        return False
+    return blob.md5_hash == md5
+
 def upload_to_gcs(local_path: Path, gcs_prefix: str) -> str:
-    """Uploads a local file to GCS and returns its URI."""
-    storage_client = storage.Client(project=config.PROJECT_ID)
-    gcs_path = f"gcs_uploads/{gcs_prefix}/{int(time.time())}_{local_path.name}"
-    blob = storage_client.bucket(config.GCS_BUCKET_NAME).blob(gcs_path)
-    blob.upload_from_filename(str(local_path))
-    uri = f"gs://{config.GCS_BUCKET_NAME}/{gcs_path}"
-    print(f"-> GCS Upload: {uri}")
-    return uri
-
-def download_from_gcs(gcs_uri: str, output_path: str) -> str:
-    """Downloads a file from a GCS bucket to the local workspace."""
-    storage_client = storage.Client(project=config.PROJECT_ID)
-    print(f"\n[HELPER: download_from_gcs] to '{output_path}'")
+    """Uploads a local file to GCS and returns its URI. Files whose bytes are already in the bucket are not re-uploaded."""
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(config.GCS_BUCKET_NAME)
+    sha256, md5 = file_digests(local_path)
+    with _upload_locks[sha256]:
+        with _upload_index_lock:
+            known = _load_upload_index()["blobs"].get(sha256)
+        if known and _blob_matches(bucket.blob(known["gcs_path"]), md5):
+            uri = f"gs://{config.GCS_BUCKET_NAME}/{known['gcs_path']}"
+            print(f"-> GCS Upload skipped (cached): {uri}")
+            with _upload_index_lock:
+                _save_upload_index()
+            return uri
+
+        gcs_path = f"gcs_uploads/{gcs_prefix}/{sha256[:16]}_{local_path.name}"
+        blob = bucket.blob(gcs_path)
+        # The object name is content-addressed, so a lost index can still be recovered from the bucket.
+        if _blob_matches(blob, md5):
+            print(f"-> GCS Upload skipped (already in bucket): gs://{config.GCS_BUCKET_NAME}/{gcs_path}")
+        else:
+            blob.upload_from_filename(str(local_path))
+            print(f"-> GCS Upload: gs://{config.GCS_BUCKET_NAME}/{gcs_path}")
+        with _upload_index_lock:
+            _load_upload_index()["blobs"][sha256] = {"gcs_path": gcs_path, "md5": md5, "uploaded_at": time.time()}
+            _save_upload_index()
+        return f"gs://{config.GCS_BUCKET_NAME}/{gcs_path}"
+
+# --- Parallel chunked downloads ---
+# Large objects are fetched as concurrent byte-range requests written in place into a preallocated
+# '.part' file. Completed chunks are recorded in a '.part.json' sidecar so an interrupted download
+# resumes where it stopped. The assembled file is checked against the blob's CRC32C (or MD5).
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_BATCH_WORKERS = 4
+
+def _parse_gcs_uri(gcs_uri: str) -> tuple:
     if not gcs_uri or not gcs_uri.startswith("gs://"): raise ValueError("Invalid GCS URI.")
     bucket_name, blob_name = gcs_uri.replace("gs://", "").split("/", 1)
-    blob = storage_client.bucket(bucket_name).blob(blob_name)
+    return bucket_name, blob_name
+
+def _checksum_matches(path: Path, blob) -> bool:
+    """Verifies a local file against the blob's CRC32C, falling back to MD5 (composite objects have no MD5)."""
+    if blob.crc32c:
+        try:
+            import google_crc32c
+            checksum = google_crc32c.Checksum()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''): checksum.update(chunk)
+            return base64.b64encode(checksum.digest()).decode('ascii') == blob.crc32c
+        except ImportError:
+            pass
+    if blob.md5_hash:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''): md5.update(chunk)
+        return base64.b64encode(md5.digest()).decode('ascii') == blob.md5_hash
+    print("  -> WARNING: Blob has no checksum metadata; skipping verification.")
+    return True
+
+def _write_at(part_path: Path, offset: int, data: bytes, fd=None):
+    if fd is not None and hasattr(os, 'pwrite'):
+        os.pwrite(fd, data, offset)
+    else:
+        # No pwrite (Windows): each writer uses its own handle, so seeks never interleave.
+        with open(part_path, 'r+b') as f:
+            f.seek(offset); f.write(data)
+
+def _download_chunked(blob, part_path: Path, state_path: Path, chunk_size: int, workers: int):
+    chunk_count = (blob.size + chunk_size - 1) // chunk_size
+    state = {"generation": blob.generation, "size": blob.size, "chunk_size": chunk_size, "done": []}
+    try:
+        saved = json.loads(state_path.read_text(encoding='utf-8'))
+        if part_path.exists() and all(saved.get(k) == state[k] for k in ("generation", "size", "chunk_size")):
+            state = saved
+    except (OSError, ValueError):
+        pass
+    done = set(state["done"])
+    if not done or not part_path.exists():
+        with open(part_path, 'wb') as f: f.truncate(blob.size)
+    else:
+        print(f"  -> Resuming download: {len(done)}/{chunk_count} chunks already present.")
+    state_lock = threading.Lock()
+
+    def fetch(index: int, fd):
+        start = index * chunk_size
+        end = min(start + chunk_size, blob.size) - 1
+        data = blob.download_as_bytes(start=start, end=end, checksum=None, if_generation_match=blob.generation)
+        if len(data) != end - start + 1: raise IOError(f"Short read for bytes {start}-{end} of {blob.name}")
+        _write_at(part_path, start, data, fd)
+        with state_lock:
+            done.add(index)
+            state["done"] = sorted(done)
+            state_path.write_text(json.dumps(state), encoding='utf-8')
+
+    pending = [i for i in range(chunk_count) if i not in done]
+    fd = os.open(part_path, os.O_WRONLY | getattr(os, 'O_BINARY', 0)) if hasattr(os, 'pwrite') else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(fetch, i, fd) for i in pending]: future.result()
+    finally:
+        if fd is not None: os.close(fd)
+
+def download_from_gcs(gcs_uri: str, output_path: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, workers: int = DOWNLOAD_WORKERS) -> str:
+    """Downloads a file from a GCS bucket to the local workspace, in parallel byte ranges, with checksum verification and resume."""
+    storage_client = get_storage_client()
+    print(f"\n[HELPER: download_from_gcs] to '{output_path}'")
+    bucket_name, blob_name = _parse_gcs_uri(gcs_uri)
+    blob = storage_client.bucket(bucket_name).get_blob(blob_name)
+    if blob is None: raise FileNotFoundError(f"GCS object not found: {gcs_uri}")
     destination_path = resolve_path_in_workspace(output_path)
-    blob.download_to_filename(str(destination_path))
-    print(f"✅ SUCCESS: Download complete.")
+    if destination_path.exists() and destination_path.stat().st_size == blob.size and _checksum_matches(destination_path, blob):
+        print(f"✅ SUCCESS: '{destination_path.name}' is already present and verified.")
+        return str(destination_path)
+
+    part_path = destination_path.with_name(destination_path.name + ".part")
+    state_path = destination_path.with_name(destination_path.name + ".part.json")
+    started = time.perf_counter()
+    if blob.size <= 2 * chunk_size:
+        blob.download_to_filename(str(part_path))
+    else:
+        _download_chunked(blob, part_path, state_path, chunk_size, workers)
+    if not _checksum_matches(part_path, blob):
+        part_path.unlink(missing_ok=True); state_path.unlink(missing_ok=True)
+        raise IOError(f"Checksum mismatch for {gcs_uri}; the partial download was discarded.")
+    os.replace(part_path, destination_path)
+    state_path.unlink(missing_ok=True)
+    elapsed = time.perf_counter() - started
+    print(f"✅ SUCCESS: Download complete ({blob.size / 1e6:.1f} MB in {elapsed:.1f}s).")
     return str(destination_path)
 
+def download_many_from_gcs(downloads: list, workers: int = DOWNLOAD_BATCH_WORKERS) -> list:
+    """Downloads a batch of (gcs_uri, output_path) pairs concurrently. Returns local paths in the same order."""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(downloads)))) as pool:
+        futures = [pool.submit(download_from_gcs, uri, path) for uri, path in downloads]
+        return [future.result() for future in futures]
+
+def wait_for_video_operation(operation) -> list:
+    """Waits for a Veo operation on the shared background poller. Returns the URIs of ALL generated videos."""
+    from ._video_operations import get_video_operation_manager
+    return get_video_operation_manager().wait(operation)
+
 def handle_video_operation(operation) -> str:
-    """Polls a video operation for its result."""
-    # Note: This helper might need adjustments if different video clients are used.
-    # For now, it assumes the genai client.
-    gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
-    print("-> Operation submitted. Polling for video result...")
-    while not operation.done:
-        time.sleep(20)
-        operation = gcp_client.operations.get(operation)
-        print("  -> Polling for status...")
-    if operation.error: raise Exception(f"API Error: {str(operation.error)}")
-    # Accessing result might differ between Veo 2 and Veo 3 clients
-    if hasattr(operation.result, 'generated_videos'):
-        return operation.result.generated_videos[0].video.uri
-    elif hasattr(operation.response, 'generated_videos'):
-         return operation.response.generated_videos[0].video.uri
-    else:
-        raise ValueError("Could not find generated video URI in operation result.")
\ No newline at end of file
+    """Waits for a video operation and returns the URI of its first video."""
+    return wait_for_video_operation(operation)[0]
+
+def download_generated_videos(gcs_uris: list, output_path: str) -> list:
+    """
+    Downloads every generated video. The first goes to output_path; the others get a numeric
+    suffix (shot_01.mp4, shot_01_2.mp4, ...). Returns the local paths in order.
+    """
+    stem, ext = os.path.splitext(output_path)
+    targets = [output_path] + [f"{stem}_{i}{ext}" for i in range(2, len(gcs_uris) + 1)]
+    return download_many_from_gcs(list(zip(gcs_uris, targets)))
@@ -0,0 +1,109 @@
+# tools/_image_preprocess.py
+# Shrinks reference images before they are sent to a model.
+# Images are downsampled to the model's largest useful edge (MAX_REFERENCE_EDGE in tools/models.py)
+# and re-encoded (JPEG for photographic images, optimized PNG for anything with transparency or
+# flat colors); masks become 1-bit PNGs, or 8-bit grayscale when they carry soft edges.
+# Results are cached by source content hash, so a sheet reused across panels is processed once. Callers
+# get a hard link in PREPARED_DIR, which stays readable even if the cache evicts the object meanwhile;
+# links whose object is gone are pruned once no caller in this process can still be using them.
+import time
+import threading
+from pathlib import Path
+from PIL import Image as PILImage
+from ._cache import ContentCache, make_cache_key
+from ._helpers import file_digests
+from .models import MAX_REFERENCE_EDGE
+import config
+
+PREPROCESS_VERSION = 1
+JPEG_QUALITY = 90
+FLAT_COLOR_LIMIT = 64
+PREPARED_DIR = Path(config.CACHE_DIR) / "prepared_references"
+# A prepared file handed out this recently is never pruned, even if its cache object was evicted.
+PREPARED_GRACE_SECONDS = 15 * 60
+_handed_out = {}
+_handed_out_lock = threading.Lock()
+REFERENCE_CACHE = ContentCache("reference_images", getattr(config, 'REFERENCE_CACHE_MAX_BYTES', 512 * 1024**2))
+
+def _fit(img, max_edge: int, resample):
+    if max_edge and max(img.size) > max_edge:
+        scale = max_edge / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), resample)
+    return img
+
+def _encode_mask(img, max_edge: int, out_base: Path) -> Path:
+    gray = _fit(img.convert("L"), max_edge, PILImage.NEAREST)
+    values = {v for v, count in enumerate(gray.histogram()) if count}
+    out_path = out_base.with_suffix(".png")
+    # A hard-edged mask only needs one bit per pixel.
+    (gray.point(lambda v: 255 if v >= 128 else 0).convert("1") if values <= {0, 255} else gray).save(out_path, optimize=True)
+    return out_path
+
+def _encode_image(img, max_edge: int, out_base: Path, kind: str) -> Path:
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = _fit(img.convert("RGBA" if has_alpha else "RGB"), max_edge, PILImage.LANCZOS)
+    # Line art, control maps and flat-color graphics compress better (and stay crisp) as PNG.
+    flat = img.getcolors(FLAT_COLOR_LIMIT) is not None
+    if has_alpha or flat or kind == "control":
+        out_path = out_base.with_suffix(".png")
+        img.save(out_path, optimize=True)
+    else:
+        out_path = out_base.with_suffix(".jpg")
+        img.save(out_path, quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out_path
+
+def _hand_out(path) -> Path:
+    with _handed_out_lock:
+        _handed_out[str(path)] = time.time()
+    return Path(path)
+
+def _prune_prepared():
+    """Removes prepared files whose cache object was evicted, keeping PREPARED_DIR within the cache's bound."""
+    now = time.time()
+    with _handed_out_lock:
+        recent = {p for p, at in _handed_out.items() if now - at < PREPARED_GRACE_SECONDS}
+    for path in PREPARED_DIR.iterdir():
+        if path.suffix not in (".png", ".jpg") or str(path) in recent: continue
+        try:
+            if path.stat().st_nlink <= 1: path.unlink()  # the store no longer links to it
+        except OSError:
+            pass
+
+def preprocess_reference(local_path, model_name: str = None, kind: str = "image") -> Path:
+    """
+    Returns a model-ready copy of a reference image. `kind` is 'image', 'control' (scribble or
+    pose maps) or 'mask'. An image already within the model's limit is returned unchanged when
+    re-encoding would not make it smaller; a mask and its input image are always resized alike.
+    """
+    local_path = Path(local_path)
+    max_edge = MAX_REFERENCE_EDGE.get(model_name)
+    sha256, _ = file_digests(local_path)
+    key = make_cache_key(sha256=sha256, max_edge=max_edge, kind=kind, version=PREPROCESS_VERSION)
+    PREPARED_DIR.mkdir(parents=True, exist_ok=True)
+    out_base = PREPARED_DIR / key[:24]
+
+    for suffix in (".png", ".jpg"):
+        cached = REFERENCE_CACHE.get(key + suffix, out_base.with_suffix(suffix))
+        if cached: return _hand_out(cached)
+    if (PREPARED_DIR / f"{key[:24]}.keep").exists():
+        return local_path
+
+    with PILImage.open(local_path) as img:
+        img.load()
+        resized = bool(max_edge) and max(img.size) > max_edge
+        out_path = _encode_mask(img, max_edge, out_base) if kind == "mask" else _encode_image(img, max_edge, out_base, kind)
+
+    original_size, new_size = local_path.stat().st_size, out_path.stat().st_size
+    if new_size >= original_size and not resized:
+        # Nothing to gain; remember that so the image is not decoded again next time.
+        out_path.unlink()
+        (PREPARED_DIR / f"{key[:24]}.keep").touch()
+        return local_path
+    REFERENCE_CACHE.put(key + out_path.suffix, out_path, meta={"source": local_path.name, "model_name": model_name, "kind": kind})
+    # Swap the encoded copy for a link to the stored object, so the bytes are kept once. (An image
+    # larger than the whole cache is evicted at once; the encoded copy is then used as is.)
+    REFERENCE_CACHE.get(key + out_path.suffix, out_path)
+    _hand_out(out_path)
+    _prune_prepared()
+    print(f"  -> Preprocessed '{local_path.name}' for {model_name or 'default'}: {original_size / 1024:.0f} KB -> {new_size / 1024:.0f} KB.")
+    return out_path
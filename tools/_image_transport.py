@@ -0,0 +1,60 @@
+# tools/_image_transport.py
+# Chooses how a local reference image reaches the API: inline bytes for small files (no storage
+# round trip, no bucket clutter) or a GCS upload for large ones. Every decision is timed and
+# appended to a JSON-lines log under config.CACHE_DIR so the size threshold can be tuned.
+import os
+import json
+import time
+import mimetypes
+import threading
+from pathlib import Path
+from google.genai.types import Image
+from ._helpers import upload_to_gcs
+from ._image_preprocess import preprocess_reference
+import config
+
+INLINE_IMAGE_MAX_BYTES = getattr(config, 'INLINE_IMAGE_MAX_BYTES', 2 * 1024 * 1024)
+TRANSPORT_LOG_PATH = Path(config.CACHE_DIR) / "image_transport_log.jsonl"
+
+_stats_lock = threading.Lock()
+_stats = {"inline": {"count": 0, "bytes": 0, "seconds": 0.0}, "gcs": {"count": 0, "bytes": 0, "seconds": 0.0}}
+
+def _record(transport: str, local_path: Path, size: int, seconds: float):
+    with _stats_lock:
+        totals = _stats[transport]
+        totals["count"] += 1; totals["bytes"] += size; totals["seconds"] += seconds
+        try:
+            TRANSPORT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(TRANSPORT_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"ts": time.time(), "transport": transport, "file": local_path.name, "bytes": size, "seconds": round(seconds, 4)}) + "\n")
+        except OSError:
+            pass  # The log is a tuning aid; never fail a generation over it.
+
+def image_reference(local_path: Path, gcs_prefix: str, max_inline_bytes: int = None, model_name: str = None, kind: str = "image") -> Image:
+    """
+    Returns a genai Image for a local file: inline image_bytes when the file is at most
+    max_inline_bytes (INLINE_IMAGE_MAX_BYTES by default), otherwise a gs:// reference.
+    With a model_name, the file is first resized and re-encoded for that model (see _image_preprocess).
+    """
+    local_path = Path(local_path)
+    if model_name:
+        local_path = preprocess_reference(local_path, model_name, kind)
+    limit = INLINE_IMAGE_MAX_BYTES if max_inline_bytes is None else max_inline_bytes
+    size = os.path.getsize(local_path)
+    mime_type = mimetypes.guess_type(local_path.name)[0] or "image/png"
+    started = time.perf_counter()
+    if size <= limit:
+        image = Image(image_bytes=local_path.read_bytes(), mime_type=mime_type)
+        transport = "inline"
+    else:
+        image = Image(gcs_uri=upload_to_gcs(local_path, gcs_prefix), mime_type=mime_type)
+        transport = "gcs"
+    elapsed = time.perf_counter() - started
+    _record(transport, local_path, size, elapsed)
+    print(f"  -> Reference '{local_path.name}' ({size / 1024:.0f} KB) sent via {transport} in {elapsed:.2f}s.")
+    return image
+
+def get_transport_stats() -> dict:
+    """Per-transport counts, bytes and average preparation time for this process."""
+    with _stats_lock:
+        return {t: dict(v, avg_seconds=round(v["seconds"] / v["count"], 4) if v["count"] else None) for t, v in _stats.items()}
@@ -0,0 +1,249 @@
+# tools/_rate_limit.py
+# Shared rate limiting and retry policy for every Google API call made by the tools.
+# - One token bucket per model family (RATE_LIMITS_PER_MINUTE in tools/models.py). A 429 halves the
+#   family's rate; each success creeps it back up, so throughput settles at the real quota.
+# - Retryable failures (429, 5xx, timeouts, dropped connections) are retried with jittered
+#   exponential backoff, honoring the server's Retry-After header when one is sent.
+# - Submits of long-running operations (Veo generate_videos) are not idempotent: a timeout or 5xx
+#   does not say whether the job was created, so submit_with_retry only retries 429s and failures
+#   that happen before the request leaves (connection refused or not established).
+# - A circuit breaker per model stops sending requests to a model that keeps failing, and lets
+#   a single probe through after a cooldown.
+import time
+import random
+import asyncio
+import threading
+import requests
+try:
+    import httpx  # transport of the google-genai SDK
+except ImportError:
+    httpx = None
+from .models import RATE_LIMITS_PER_MINUTE, model_family
+
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+BREAKER_FAILURE_THRESHOLD = 8
+BREAKER_COOLDOWN_SECONDS = 60.0
+DEFAULT_RATE_PER_MINUTE = 30
+MIN_RATE_FRACTION = 0.125
+RECOVERY_FRACTION = 0.05
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+class TokenBucket:
+    """
+    Reservation-style token bucket. reserve() always takes a token and returns how long the caller
+    must wait before using it, so the same bucket serves threads (sleep) and coroutines (await).
+    """
+    def __init__(self, rate_per_minute: float, burst: int = None):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst or max(1, int(rate_per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def throttle(self):
+        """Multiplicative decrease after a 429."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+
+    def recover(self):
+        """Additive increase after a success, up to the configured rate."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` seconds one probe call is allowed."""
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None: return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self, name: str):
+        with self._lock:
+            state = self.state
+            if state == "closed": return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Circuit open for '{name}' after {self.failures} consecutive failures; retry in {remaining:.0f}s.")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+# --- Registries ---
+_lock = threading.Lock()
+_buckets = {}
+_breakers = {}
+_stats = {}
+
+def get_bucket(model: str) -> TokenBucket:
+    family = model_family(model)
+    with _lock:
+        if family not in _buckets:
+            _buckets[family] = TokenBucket(RATE_LIMITS_PER_MINUTE.get(family, DEFAULT_RATE_PER_MINUTE))
+        return _buckets[family]
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _lock:
+        if model not in _breakers:
+            _breakers[model] = CircuitBreaker()
+        return _breakers[model]
+
+def _count(model: str, key: str):
+    with _lock:
+        stats = _stats.setdefault(model, {"calls": 0, "retries": 0, "throttled": 0, "failures": 0})
+        stats[key] += 1
+
+def get_rate_limit_stats() -> dict:
+    """Per-model call/retry/throttle counters, the family's current rate and the breaker state."""
+    with _lock:
+        models = list(_stats.items())
+    return {model: dict(stats, rate_per_minute=round(get_bucket(model).rate * 60, 1), breaker=get_breaker(model).state) for model, stats in models}
+
+# --- Error classification ---
+def _status_code(exc):
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int): return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header, if the error carries an HTTP response that sent one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc) -> bool:
+    if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError, ConnectionError, TimeoutError)):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES
+
+def _pre_send_errors() -> tuple:
+    errors = (requests.exceptions.ConnectTimeout, ConnectionRefusedError)
+    if httpx is not None: errors += (httpx.ConnectError, httpx.ConnectTimeout)
+    return errors
+
+def is_retryable_submit(exc) -> bool:
+    """Retry policy for non-idempotent submits: only failures that prove no job was created."""
+    return isinstance(exc, _pre_send_errors()) or _status_code(exc) == 429
+
+def _backoff(attempt: int, exc) -> float:
+    delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** attempt)))
+    retry_after = _retry_after(exc)
+    return max(delay, retry_after) if retry_after is not None else delay
+
+def _on_failure(model: str, exc, attempt: int, retryable=is_retryable):
+    """Records a failed attempt. Returns the delay before the next attempt, or None to give up."""
+    if not retryable(exc):
+        # The model answered (e.g. 400 invalid argument), so the request failed, not the service.
+        get_breaker(model).record_success()
+        _count(model, "failures")
+        return None
+    get_breaker(model).record_failure()
+    if _status_code(exc) == 429:
+        get_bucket(model).throttle()
+        _count(model, "throttled")
+    if attempt + 1 >= RETRY_MAX_ATTEMPTS:
+        _count(model, "failures")
+        return None
+    _count(model, "retries")
+    delay = _backoff(attempt, exc)
+    print(f"  -> [{model}] {type(exc).__name__}: {exc}. Retrying in {delay:.1f}s (attempt {attempt + 2}/{RETRY_MAX_ATTEMPTS}).")
+    return delay
+
+def _on_success(model: str):
+    get_breaker(model).record_success()
+    get_bucket(model).recover()
+
+def call_with_retry(model: str, func, /, *args, **kwargs):
+    """
+    Calls func(*args, **kwargs) under the model's rate limit, circuit breaker and retry policy.
+    `model` is a model name from tools/models.py or a family name such as "chirp". It is
+    positional-only, so func may itself take a `model=` keyword (as the genai SDK calls do).
+    """
+    return _call(model, func, args, kwargs, is_retryable)
+
+def submit_with_retry(model: str, func, /, *args, **kwargs):
+    """
+    call_with_retry for calls that start a billed long-running operation. Only 429s and errors
+    raised before the request is sent are retried, so a lost response never starts a second job.
+    """
+    return _call(model, func, args, kwargs, is_retryable_submit)
+
+def _call(model: str, func, args: tuple, kwargs: dict, retryable):
+    attempt = 0
+    while True:
+        get_breaker(model).before_call(model)
+        time.sleep(get_bucket(model).reserve())
+        _count(model, "calls")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _on_failure(model, e, attempt, retryable)
+            if delay is None: raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        _on_success(model)
+        return result
+
+async def call_with_retry_async(model: str, make_coro):
+    """Async form of call_with_retry. `make_coro` is a zero-argument callable returning a fresh awaitable per attempt."""
+    attempt = 0
+    while True:
+        get_breaker(model).before_call(model)
+        await asyncio.sleep(get_bucket(model).reserve())
+        _count(model, "calls")
+        try:
+            result = await make_coro()
+        except Exception as e:
+            delay = _on_failure(model, e, attempt)
+            if delay is None: raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        _on_success(model)
+        return result
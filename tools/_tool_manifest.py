@@ -0,0 +1,173 @@
+# tools/_tool_manifest.py
+# Builds tool schemas WITHOUT importing the tool modules.
+# Each nyra_* module is parsed with `ast`, and the resulting FunctionDeclaration data is cached in a
+# versioned JSON manifest. A module is re-parsed only when its file changes, and the manifest is
+# rewritten only when a tool's signature or docstring actually changed. The functions themselves are
+# exposed as LazyTool proxies that import their (heavy) module on the first call.
+import os
+import ast
+import json
+import hashlib
+import importlib
+import threading
+
+MANIFEST_VERSION = 1
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.path.join(TOOLS_DIR, "__pycache__", "tool_manifest.json")
+
+SCALAR_TYPES = {"str": "string", "int": "integer", "float": "number", "bool": "boolean"}
+
+class LazyTool:
+    """A callable stand-in for a tool function; the defining module is imported on first use."""
+    def __init__(self, module_name: str, func_name: str):
+        self.module_name = module_name
+        self.__name__ = func_name
+        self._func = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    module = importlib.import_module(self.module_name)
+                    self._func = getattr(module, self.__name__)
+        return self._func
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"LazyTool({self.module_name}.{self.__name__}, loaded={self._func is not None})"
+
+# --- Source parsing ---
+def _enum_values(node: ast.ClassDef):
+    base_names = {ast.unparse(b) for b in node.bases}
+    if not any(b.endswith("Enum") for b in base_names): return None
+    values = []
+    for stmt in node.body:
+        if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Constant):
+            values.append(stmt.value.value)
+    return values
+
+def _param_schema(annotation, enums: dict) -> dict:
+    """Mirrors _schema_helper.create_function_declaration, working on annotation source text."""
+    if annotation is None: return {"type": "string"}
+    if isinstance(annotation, ast.Subscript):
+        outer = ast.unparse(annotation.value).split(".")[-1]
+        inner = annotation.slice
+        if outer == "Optional":
+            return _param_schema(inner, enums)
+        if outer in ("list", "List"):
+            return {"type": "array", "items": {"type": SCALAR_TYPES.get(ast.unparse(inner), "string")}}
+        return {"type": "string"}
+    name = ast.unparse(annotation)
+    if name in enums:
+        return {"type": "string", "enum": enums[name]}
+    return {"type": SCALAR_TYPES.get(name, "string")}
+
+def _declaration(func: ast.FunctionDef, enums: dict) -> dict:
+    args = func.args.args
+    defaults_start = len(args) - len(func.args.defaults)
+    properties, required = {}, []
+    for i, arg in enumerate(args):
+        properties[arg.arg] = _param_schema(arg.annotation, enums)
+        if i < defaults_start: required.append(arg.arg)
+    return {
+        "name": func.name,
+        "description": ast.get_docstring(func) or "",
+        "parameters": {"type": "object", "properties": properties, "required": required}
+    }
+
+def parse_tool_module(path: str) -> dict:
+    """Extracts every top-level function declaration and the module's `_TOOL_FUNCTIONS` list, if any."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    enums, funcs, registered = {}, {}, None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            values = _enum_values(node)
+            if values is not None: enums[node.name] = values
+        elif isinstance(node, ast.FunctionDef) and not node.name.startswith("_"):
+            funcs[node.name] = node
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "_TOOL_FUNCTIONS" for t in node.targets):
+            if isinstance(node.value, (ast.List, ast.Tuple)):
+                registered = [elt.id for elt in node.value.elts if isinstance(elt, ast.Name)]
+    declarations = {name: _declaration(func, enums) for name, func in funcs.items()}
+    signature_hash = hashlib.sha256(json.dumps(declarations, sort_keys=True).encode("utf-8")).hexdigest()
+    return {"declarations": declarations, "registered": registered, "signature_hash": signature_hash}
+
+# --- Manifest cache ---
+_manifest_lock = threading.Lock()
+
+def _source_stamp(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def _read_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION: return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "modules": {}}
+
+def _write_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def load_module_entries(module_files: list) -> dict:
+    """
+    Returns {module_file: parsed entry} for the given nyra_* file names, using the manifest where the
+    source is unchanged and re-parsing otherwise.
+    """
+    with _manifest_lock:
+        manifest = _read_manifest()
+        entries, dirty = {}, False
+        for filename in module_files:
+            path = os.path.join(TOOLS_DIR, filename)
+            stamp = _source_stamp(path)
+            cached = manifest["modules"].get(filename)
+            if cached and cached.get("source_stamp") == stamp:
+                entries[filename] = cached
+                continue
+            # A body-only edit leaves the manifest file alone; the module is just re-parsed (cheap)
+            # until the next signature change rewrites it.
+            parsed = parse_tool_module(path)
+            parsed["source_stamp"] = stamp
+            if not cached or cached.get("signature_hash") != parsed["signature_hash"] or cached.get("registered") != parsed["registered"]:
+                dirty = True
+            manifest["modules"][filename] = parsed
+            entries[filename] = parsed
+        if dirty:
+            try:
+                _write_manifest(manifest)
+            except OSError as e:
+                print(f"Warning: Could not write tool manifest to {MANIFEST_PATH}. Error: {e}")
+        return entries
+
+def build_tools(tool_specs: list):
+    """
+    Builds (function_declarations, tool_registry) for a list of (module_file, function_name) pairs.
+    Declarations are plain dicts ready for genai.types.FunctionDeclaration(**d); the registry maps
+    each tool name to a LazyTool.
+    """
+    entries = load_module_entries(sorted({module_file for module_file, _ in tool_specs}))
+    declarations, registry = [], {}
+    for module_file, func_name in tool_specs:
+        declaration = entries[module_file]["declarations"].get(func_name)
+        if declaration is None:
+            print(f"Warning: Tool '{func_name}' was not found in {module_file}.")
+            continue
+        declarations.append(declaration)
+        registry[func_name] = LazyTool(f"tools.{module_file[:-3]}", func_name)
+    return declarations, registry
+
+def discover_registered_tools() -> list:
+    """Lists (module_file, function_name) for every nyra_* module that declares `_TOOL_FUNCTIONS`."""
+    module_files = sorted(f for f in os.listdir(TOOLS_DIR) if f.startswith("nyra_") and f.endswith(".py"))
+    entries = load_module_entries(module_files)
+    return [(module_file, name) for module_file in module_files for name in (entries[module_file]["registered"] or [])]
@@ -0,0 +1,268 @@
+# tools/_video_assembly.py
+# Building blocks for compile_final_video. Clips are probed up front; when every clip shares codec,
+# resolution, pixel format and timebase, the video track is joined with the concat demuxer and
+# stream-copied, and only the audio mix is encoded. Mismatched inputs take the filter-graph path.
+# When re-encoding is unavoidable, clips are normalized and encoded as independent segments by parallel
+# ffmpeg processes with identical encoder settings, then joined by stream copy.
+# FADE_TO_BLACK transitions are smart-rendered on the copy path: each clip is cut at the keyframes
+# nearest its faded edges, only those short edge pieces are decoded, faded and re-encoded, and the
+# pieces (as MPEG-TS, which carries codec headers in-band) are spliced back together by stream copy.
+# The spliced file is decoded once as a check; if the re-encoded pieces' parameter sets do not sit
+# cleanly under the MP4 sample entry taken from the first piece, the caller re-encodes instead.
+import os
+import time
+import shutil
+import tempfile
+from fractions import Fraction
+from concurrent.futures import ThreadPoolExecutor
+import ffmpeg
+import config
+
+ENCODE_CRF = 18
+ENCODE_PRESET = "medium"
+# Parallel ffmpeg encoders; each gets an equal share of the cores as x264 threads.
+ENCODE_WORKERS = getattr(config, 'VIDEO_ENCODE_WORKERS', None) or max(1, min(8, (os.cpu_count() or 4) // 4))
+# Length of the fade out of a clip and of the fade in of the next one at a FADE_TO_BLACK transition.
+FADE_SECONDS = 0.5
+# Stream properties that must match for clips to be joined without re-encoding.
+COPY_COMPATIBLE_KEYS = ("codec_name", "profile", "level", "width", "height", "pix_fmt", "time_base", "r_frame_rate", "sample_aspect_ratio")
+# ffprobe H.264 profile names -> libx264 -profile:v values, for smart-rendered pieces.
+X264_PROFILES = {
+    "Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+    "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444",
+}
+
+def probe_video(path: str) -> dict:
+    """The first video stream's properties (plus the container duration) as reported by ffprobe."""
+    info = ffmpeg.probe(path)
+    stream = next((s for s in info['streams'] if s['codec_type'] == 'video'), None)
+    if stream is None: raise ValueError(f"No video stream in '{path}'")
+    props = {key: stream.get(key) for key in COPY_COMPATIBLE_KEYS}
+    if props["sample_aspect_ratio"] in (None, "0:1"): props["sample_aspect_ratio"] = "1:1"
+    props["duration"] = float(stream.get('duration') or info['format'].get('duration') or 0)
+    props["has_audio"] = any(s['codec_type'] == 'audio' for s in info['streams'])
+    return props
+
+def probe_videos(paths: list) -> list:
+    """Probes clips concurrently; ffprobe is I/O- and process-bound, not CPU-bound."""
+    with ThreadPoolExecutor(max_workers=min(8, len(paths)) or 1) as pool:
+        return list(pool.map(probe_video, paths))
+
+def copy_compatible(probes: list) -> bool:
+    """True when every clip can be concatenated by stream copy."""
+    first = {key: probes[0][key] for key in COPY_COMPATIBLE_KEYS}
+    return all({key: p[key] for key in COPY_COMPATIBLE_KEYS} == first for p in probes[1:])
+
+def write_concat_list(paths: list, list_dir: str = None) -> str:
+    """Writes an ffconcat list for the concat demuxer and returns its path."""
+    fd, list_path = tempfile.mkstemp(suffix=".ffconcat", dir=list_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write("ffconcat version 1.0\n")
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+def mixed_audio(audio_paths: list):
+    """The narration/music clips concatenated into one audio stream (None when there are none)."""
+    if not audio_paths: return None
+    return ffmpeg.concat(*[ffmpeg.input(p).audio for p in audio_paths], v=0, a=1)
+
+def concat_copy(video_paths: list, audio_paths: list, output_path: str):
+    """Joins compatible clips with the concat demuxer (video stream-copied) and encodes only the audio."""
+    list_path = write_concat_list(video_paths, os.path.dirname(output_path))
+    try:
+        video = ffmpeg.input(list_path, f='concat', safe=0).video
+        audio = mixed_audio(audio_paths)
+        streams = [video, audio] if audio is not None else [video]
+        output_args = {"vcodec": 'copy', "movflags": '+faststart'}
+        if audio is not None: output_args.update(acodec='aac', shortest=None)
+        return ffmpeg.output(*streams, output_path, **output_args).run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+    finally:
+        os.remove(list_path)
+
+def clip_fades(transitions: list, probes: list) -> list:
+    """Per clip (fade_in, fade_out, duration), from transitions[i] = the transition after clip i."""
+    transitions = list(transitions or [])
+    faded = [i < len(transitions) and transitions[i] == "FADE_TO_BLACK" for i in range(len(probes) - 1)]
+    return [(i > 0 and faded[i - 1], i < len(faded) and faded[i], p["duration"]) for i, p in enumerate(probes)]
+
+def _faded(stream, fade: tuple, reset_pts: bool = True):
+    fade_in, fade_out, duration = fade or (False, False, 0)
+    if not (fade_in or fade_out): return stream
+    # Fade times are relative to the clip start. (setpts drops the frame rate, so callers that
+    # follow with an fps filter reset the timestamps themselves, before it.)
+    if reset_pts: stream = stream.filter('setpts', 'PTS-STARTPTS')
+    if fade_in: stream = stream.filter('fade', type='in', start_time=0, duration=FADE_SECONDS)
+    if fade_out: stream = stream.filter('fade', type='out', start_time=max(0.0, duration - FADE_SECONDS), duration=FADE_SECONDS)
+    return stream
+
+def normalized_video(path: str, target: dict, fade: tuple = None):
+    """A clip's video scaled and padded to the target frame size, square pixels and frame rate, with any fades applied."""
+    width, height = target["width"], target["height"]
+    stream = ffmpeg.input(path).video
+    if fade and (fade[0] or fade[1]): stream = stream.filter('setpts', 'PTS-STARTPTS')
+    return _faded(
+        stream
+        .filter('scale', width, height, force_original_aspect_ratio='decrease')
+        .filter('pad', width, height, '(ow-iw)/2', '(oh-ih)/2')
+        .filter('setsar', 1)
+        .filter('fps', fps=target["r_frame_rate"]),
+        fade, reset_pts=False
+    )
+
+def concat_reencode(video_paths: list, audio_paths: list, output_path: str, target: dict, fades: list = None):
+    """Joins clips through the concat filter graph, normalizing each to `target` (a probe_video result) first."""
+    fades = fades or [None] * len(video_paths)
+    video = ffmpeg.concat(*[normalized_video(p, target, f) for p, f in zip(video_paths, fades)], v=1, a=0)
+    audio = mixed_audio(audio_paths)
+    streams = [video, audio] if audio is not None else [video]
+    output_args = {"vcodec": 'libx264', "pix_fmt": 'yuv420p', "crf": ENCODE_CRF, "preset": ENCODE_PRESET, "movflags": '+faststart'}
+    if audio is not None: output_args.update(acodec='aac', shortest=None)
+    return ffmpeg.output(*streams, output_path, **output_args).run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+
+# --- Segmented parallel encoding ---
+def _encode_segment(path: str, target: dict, segment_path: str, threads: int, crf: int, preset: str, fade: tuple = None):
+    fps = Fraction(target["r_frame_rate"])
+    # Identical settings for every segment keep them stream-copy compatible; each starts on a keyframe.
+    return ffmpeg.output(
+        normalized_video(path, target, fade), segment_path, vcodec='libx264', pix_fmt='yuv420p', crf=crf, preset=preset,
+        g=max(1, round(fps * 2)), threads=threads, video_track_timescale=fps.numerator * 1000
+    ).run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+
+def encode_segments(video_paths: list, target: dict, work_dir: str, workers: int = None, crf: int = ENCODE_CRF, preset: str = ENCODE_PRESET, fades: list = None) -> list:
+    """Normalizes and encodes each clip to its own segment file on `workers` parallel ffmpeg processes."""
+    fades = fades or [None] * len(video_paths)
+    workers = max(1, min(workers or ENCODE_WORKERS, len(video_paths)))
+    threads = max(1, (os.cpu_count() or 4) // workers)
+    segment_paths = [os.path.join(work_dir, f"segment_{i:03d}.mp4") for i in range(len(video_paths))]
+    # Threads only supervise the ffmpeg child processes, which do the actual encoding.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_encode_segment, p, target, sp, threads, crf, preset, f) for p, sp, f in zip(video_paths, segment_paths, fades)]
+        for future in futures: future.result()
+    return segment_paths
+
+def concat_segmented(video_paths: list, audio_paths: list, output_path: str, target: dict, workers: int = None, fades: list = None):
+    """Re-encodes clips as parallel segments, then joins them (and the audio mix) by stream copy."""
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(output_path))
+    try:
+        segment_paths = encode_segments(video_paths, target, work_dir, workers, fades=fades)
+        return concat_copy(segment_paths, audio_paths, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# --- Smart rendering of transitions ---
+def keyframe_times(path: str) -> list:
+    """Presentation times (seconds) of the video keyframes, read without decoding."""
+    info = ffmpeg.probe(path, select_streams='v:0', skip_frame='nokey', show_entries='frame=pts_time,best_effort_timestamp_time')
+    return sorted(float(f.get('pts_time') or f['best_effort_timestamp_time']) for f in info.get('frames', []))
+
+def _split_at_keyframes(path: str, cut_times: list, probe: dict, piece_base: str) -> list:
+    """Stream-copies a clip into MPEG-TS pieces cut at the given keyframe times."""
+    if not cut_times:
+        out_path = f"{piece_base}_000.ts"
+        ffmpeg.output(ffmpeg.input(path).video, out_path, vcodec='copy', f='mpegts').run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+        return [out_path]
+    # The segment muxer cuts at the first keyframe at or after each time; aim half a frame early.
+    half_frame = 0.5 / float(Fraction(probe["r_frame_rate"]))
+    ffmpeg.output(
+        ffmpeg.input(path).video, f"{piece_base}_%03d.ts", vcodec='copy', f='segment', segment_format='mpegts',
+        segment_times=",".join(f"{max(0.0, t - half_frame):.6f}" for t in cut_times), reset_timestamps=1
+    ).run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+    return [f"{piece_base}_{i:03d}.ts" for i in range(len(cut_times) + 1)]
+
+def piece_encoder_args(probe: dict):
+    """
+    libx264 options that reproduce the clip's H.264 profile and level, so re-encoded edge pieces splice
+    cleanly between stream-copied ones. None when the clip cannot be matched (not H.264, or an
+    unknown profile/level); such clips must be re-encoded whole instead.
+    """
+    profile = X264_PROFILES.get(probe.get("profile"))
+    level = probe.get("level")
+    if probe.get("codec_name") != "h264" or profile is None or not level or level <= 0: return None
+    # x264's baseline output already satisfies Constrained Baseline. ffprobe reports level 4.1 as 41.
+    return {"profile:v": profile, "level": f"{level / 10:.1f}"}
+
+def _encode_piece(piece_path: str, out_path: str, probe: dict, fade: tuple):
+    """Re-encodes one edge piece with its fade, matching the clip's stream format, profile and level."""
+    return ffmpeg.output(
+        _faded(ffmpeg.input(piece_path).video, fade), out_path, vcodec='libx264', pix_fmt=probe["pix_fmt"],
+        crf=ENCODE_CRF, preset=ENCODE_PRESET, r=probe["r_frame_rate"], f='mpegts', **piece_encoder_args(probe)
+    ).run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
+
+def _smart_render_clip(index: int, path: str, probe: dict, fade: tuple, work_dir: str) -> tuple:
+    """Cuts one clip into pieces and re-encodes only the faded edges. Returns (piece paths, re-encoded seconds)."""
+    fade_in, fade_out, duration = fade
+    piece_base = os.path.join(work_dir, f"clip_{index:03d}")
+    if not (fade_in or fade_out):
+        return _split_at_keyframes(path, [], probe, piece_base), 0.0
+    keyframes = keyframe_times(path)
+    # Head piece: up to the first keyframe that leaves room for the fade in; tail piece: from the
+    # last keyframe before the fade out starts. Everything in between stays untouched.
+    head_end = next((t for t in keyframes if t >= FADE_SECONDS), None) if fade_in else 0.0
+    tail_start = next((t for t in reversed(keyframes) if t <= duration - FADE_SECONDS), None) if fade_out else duration
+    if head_end is None or tail_start is None or (fade_in and fade_out and tail_start <= head_end):
+        # Too few keyframes to isolate the edges: the whole clip is one re-encoded piece.
+        out_path = f"{piece_base}_full.ts"
+        _encode_piece(path, out_path, probe, fade)
+        return [out_path], duration
+
+    cut_times = ([head_end] if fade_in else []) + ([tail_start] if fade_out and tail_start > 0 else [])
+    pieces = _split_at_keyframes(path, cut_times, probe, piece_base)
+    reencoded = 0.0
+    if fade_in:
+        out_path = f"{piece_base}_head.ts"
+        _encode_piece(pieces[0], out_path, probe, (True, False, head_end))
+        pieces[0], reencoded = out_path, reencoded + head_end
+    if fade_out:
+        out_path = f"{piece_base}_tail.ts"
+        _encode_piece(pieces[-1], out_path, probe, (False, True, duration - tail_start))
+        pieces[-1], reencoded = out_path, reencoded + duration - tail_start
+    return pieces, reencoded
+
+def can_smart_render(probes: list) -> bool:
+    """True when the clips can be stream-copied and their faded edges re-encoded to the same profile and level."""
+    return copy_compatible(probes) and piece_encoder_args(probes[0]) is not None
+
+def concat_smart(video_paths: list, audio_paths: list, output_path: str, probes: list, fades: list, workers: int = None):
+    """
+    Joins copy-compatible clips with fades at FADE_TO_BLACK boundaries, re-encoding only the
+    keyframe-aligned windows around each boundary. Requires can_smart_render(probes).
+    Returns (stdout, stderr, re-encoded seconds).
+    """
+    work_dir = tempfile.mkdtemp(prefix="smart_render_", dir=os.path.dirname(output_path))
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers or ENCODE_WORKERS, len(video_paths)))) as pool:
+            results = list(pool.map(_smart_render_clip, range(len(video_paths)), video_paths, probes, fades, [work_dir] * len(video_paths)))
+        pieces = [piece for clip_pieces, _ in results for piece in clip_pieces]
+        stdout, stderr = concat_copy(pieces, audio_paths, output_path)
+        return stdout, stderr, sum(seconds for _, seconds in results)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def decodes_cleanly(path: str) -> bool:
+    """True when ffmpeg decodes the whole video track of path without reporting an error."""
+    try:
+        _, stderr = ffmpeg.input(path).video.output('-', f='null').global_args('-v', 'error').run(capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error:
+        return False
+    return not stderr.strip()
+
+def benchmark(video_paths: list, audio_paths: list, output_dir: str, worker_counts: list) -> list:
+    """
+    Times the single-process filter graph against segmented encoding at each worker count.
+    Outputs are kept in output_dir for inspection. Returns one result per run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    target = probe_videos(video_paths)[0]
+    runs = [("filter_graph", None)] + [(f"segmented_{n}", n) for n in worker_counts]
+    results = []
+    for label, workers in runs:
+        output_path = os.path.join(output_dir, f"benchmark_{label}.mp4")
+        started = time.perf_counter()
+        if workers is None: concat_reencode(video_paths, audio_paths, output_path, target)
+        else: concat_segmented(video_paths, audio_paths, output_path, target, workers)
+        results.append({"mode": label, "workers": workers or 1, "seconds": round(time.perf_counter() - started, 2), "output_path": output_path})
+    baseline = results[0]["seconds"]
+    for result in results: result["speedup"] = round(baseline / result["seconds"], 2) if result["seconds"] else None
+    return results
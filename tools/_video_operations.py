@@ -0,0 +1,162 @@
+# tools/_video_operations.py
+# One background poller for every in-flight Veo long-running operation.
+# Callers submit an operation and get a Future (or an asyncio awaitable) that resolves to the
+# gs:// URIs of ALL generated videos. Each operation is polled on its own adaptive schedule:
+# quickly at first, then backing off for long jobs, so finished jobs are noticed within seconds
+# and dozens of concurrent jobs cost one thread instead of dozens of sleeping ones.
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from ._helpers import get_genai_client
+
+POLL_INITIAL_SECONDS = 3.0
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_SECONDS = 30.0
+POLL_MAX_CONSECUTIVE_ERRORS = 5
+OPERATION_TIMEOUT_SECONDS = 30 * 60
+
+def operation_video_uris(operation) -> list:
+    """Returns the URI of every generated video in a finished operation."""
+    # Veo 2 and Veo 3 clients expose the videos on either .result or .response.
+    for holder in (getattr(operation, 'result', None), getattr(operation, 'response', None)):
+        videos = getattr(holder, 'generated_videos', None)
+        if videos:
+            return [v.video.uri for v in videos]
+    raise ValueError("Could not find generated video URI in operation result.")
+
+def _settle(future: Future, result=None, error: Exception = None):
+    """Settles a future unless it is already done (wait_async's awaiting task may have cancelled it)."""
+    if future.done(): return
+    try:
+        if error is not None: future.set_exception(error)
+        else: future.set_result(result)
+    except InvalidStateError:
+        pass  # cancelled between the check and the call
+
+class _TrackedOperation:
+    def __init__(self, operation, future: Future):
+        self.operation = operation
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.interval = POLL_INITIAL_SECONDS
+        self.next_poll_at = self.submitted_at + self.interval
+        self.errors = 0
+        self.polls = 0
+
+class VideoOperationManager:
+    """Tracks many Veo operations with a single daemon polling thread and the shared genai client."""
+    def __init__(self, client=None):
+        self._client = client
+        self._tracked = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_genai_client()
+        return self._client
+
+    def submit(self, operation) -> Future:
+        """Starts tracking an operation. The returned Future resolves to a list of gs:// video URIs."""
+        future = Future()
+        if getattr(operation, 'done', False):
+            self._resolve(_TrackedOperation(operation, future))
+            return future
+        key = getattr(operation, 'name', None) or id(operation)
+        with self._cond:
+            existing = self._tracked.get(key)
+            if existing and not existing.future.done():
+                return existing.future
+            self._tracked[key] = _TrackedOperation(operation, future)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._poll_loop, name="veo-operation-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        print(f"-> Operation submitted. Tracking {len(self._tracked)} in-flight video operation(s).")
+        return future
+
+    def wait(self, operation, timeout: float = None) -> list:
+        """Blocks until the operation finishes and returns every generated video URI."""
+        return self.submit(operation).result(timeout=timeout)
+
+    def wait_async(self, operation):
+        """Awaitable form of wait() for use inside an event loop."""
+        return asyncio.wrap_future(self.submit(operation))
+
+    def in_flight(self) -> int:
+        with self._cond:
+            return len(self._tracked)
+
+    def _resolve(self, tracked: _TrackedOperation):
+        operation = tracked.operation
+        try:
+            if operation.error: raise Exception(f"API Error: {str(operation.error)}")
+            uris = operation_video_uris(operation)
+            elapsed = time.monotonic() - tracked.submitted_at
+            print(f"  -> Video operation finished after {elapsed:.0f}s ({tracked.polls} polls, {len(uris)} video(s)).")
+            _settle(tracked.future, result=uris)
+        except Exception as e:
+            _settle(tracked.future, error=e)
+
+    def _poll_loop(self):
+        while True:
+            with self._cond:
+                while not self._tracked:
+                    self._cond.wait()
+                now = time.monotonic()
+                next_due = min(t.next_poll_at for t in self._tracked.values())
+                if next_due > now:
+                    self._cond.wait(timeout=next_due - now)
+                    continue
+                due = [(k, t) for k, t in self._tracked.items() if t.next_poll_at <= now]
+
+            for key, tracked in due:
+                try:
+                    finished = self._poll_one(tracked)
+                except Exception as e:
+                    # One bad entry must never take down the only poller; drop it and carry on.
+                    print(f"  -> Dropping video operation after an unexpected polling failure: {e}")
+                    _settle(tracked.future, error=e)
+                    finished = True
+                if finished:
+                    with self._cond:
+                        if self._tracked.get(key) is tracked:
+                            del self._tracked[key]
+
+    def _poll_one(self, tracked: _TrackedOperation) -> bool:
+        """Polls one operation and reschedules it. Returns True once its future is settled."""
+        if tracked.future.done():
+            return True  # cancelled by its waiter; stop polling it
+        now = time.monotonic()
+        if now - tracked.submitted_at > OPERATION_TIMEOUT_SECONDS:
+            _settle(tracked.future, error=FutureTimeoutError(f"Video operation did not finish within {OPERATION_TIMEOUT_SECONDS}s."))
+            return True
+        try:
+            tracked.operation = self.client.operations.get(tracked.operation)
+            tracked.polls += 1
+            tracked.errors = 0
+        except Exception as e:
+            tracked.errors += 1
+            print(f"  -> Polling error ({tracked.errors}/{POLL_MAX_CONSECUTIVE_ERRORS}): {e}")
+            if tracked.errors >= POLL_MAX_CONSECUTIVE_ERRORS:
+                _settle(tracked.future, error=e)
+                return True
+        if getattr(tracked.operation, 'done', False):
+            self._resolve(tracked)
+            return True
+        tracked.interval = min(tracked.interval * POLL_BACKOFF_FACTOR, POLL_MAX_SECONDS)
+        tracked.next_poll_at = time.monotonic() + tracked.interval
+        return False
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_video_operation_manager() -> VideoOperationManager:
+    """Returns the process-wide operation manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = VideoOperationManager()
+        return _manager
@@ -0,0 +1,86 @@
+# tools/agent_runtime.py
+# Shared orchestration loop for the run_*.py scripts.
+# Every function_call part of a model turn is dispatched concurrently against the
+# tool registry, and all function_responses are returned to the model in ONE follow-up turn.
+import asyncio
+import json
+from google.genai import types as genai_types
+from tools.chat_history import ChatHistoryManager
+from tools._rate_limit import call_with_retry_async
+
+class AgentRuntime:
+    """
+    Drives a tool-calling chat session with a Gemini model.
+    The model's function calls are executed in worker threads (the tools are blocking),
+    so a turn that asks for three images and a music track costs one round trip
+    and the latency of the slowest tool.
+    """
+    def __init__(self, client, model: str, config_params, tool_registry: dict, chat_history: list, speaker: str = "NYRA", user_label: str = "DIRECTOR", history_manager: ChatHistoryManager = None):
+        self.client = client
+        self.model = model
+        self.config_params = config_params
+        self.tool_registry = tool_registry
+        self.chat_history = chat_history
+        # Compacts completed steps and keeps each request under the configured token budget.
+        self.history = history_manager or ChatHistoryManager(chat_history)
+        self.speaker = speaker
+        self.user_label = user_label
+        # Results of every tool executed during the most recent turn, in call order.
+        self.last_tool_results = []
+        self._loop = None
+
+    async def _dispatch(self, call):
+        tool_name = call.name
+        tool_args = dict(call.args or {})
+        print(f"\033[93m[{self.speaker} ACTION] > Calling tool: {tool_name}({json.dumps(tool_args)})\033[0m")
+        try:
+            tool_function = self.tool_registry[tool_name]
+            tool_result = await asyncio.to_thread(tool_function, **tool_args)
+            print(f"\033[94m[TOOL RESULT] > {tool_result}\033[0m")
+            return tool_result, genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'result': self.history.truncate_tool_output(str(tool_result))}))
+        except Exception as e:
+            error_str = str(e)
+            print(f"\033[91m[TOOL ERROR] > {tool_name}: {error_str}\033[0m")
+            return f"Error: {error_str}", genai_types.Part(function_response=genai_types.FunctionResponse(name=tool_name, response={'error': error_str}))
+
+    async def execute_turn_async(self, prompt_text: str) -> str:
+        """Sends a user prompt and resolves all tool calls until the model replies with text. Returns "STOP" on a blocked response."""
+        print(f"\033[92m[{self.user_label}] > {prompt_text}\033[0m")
+        prompt_message = {'role': 'user', 'parts': [{'text': prompt_text}]}
+        self.chat_history.append(prompt_message)
+        self.last_tool_results = []
+
+        while True:
+            self.history.enforce_budget()
+            response = await call_with_retry_async(self.model, lambda: self.client.aio.models.generate_content(model=self.model, contents=self.chat_history, config=self.config_params))
+            self.history.record_usage(response)
+
+            if not response.candidates or not response.candidates[0].content or not response.candidates[0].content.parts:
+                print("\033[91m[API ERROR] > Model returned an empty or blocked response.\033[0m")
+                if getattr(response, 'prompt_feedback', None):
+                    print(f"   -> Prompt Feedback: {response.prompt_feedback}")
+                if response.candidates and getattr(response.candidates[0], 'finish_reason', None):
+                    print(f"   -> Finish Reason: {response.candidates[0].finish_reason.name}")
+                return "STOP"
+
+            parts = response.candidates[0].content.parts
+            calls = [p.function_call for p in parts if getattr(p, 'function_call', None)]
+
+            if not calls:
+                final_text = "".join(p.text for p in parts if getattr(p, 'text', None))
+                self.chat_history.append({'role': 'model', 'parts': [{'text': final_text}]})
+                print(f"\033[96m[{self.speaker}] > {final_text}\033[0m")
+                self.history.compact_turn(prompt_message)
+                return final_text
+
+            # All calls of this turn are answered together, in the order the model issued them.
+            self.chat_history.append({'role': 'model', 'parts': list(parts)})
+            outcomes = await asyncio.gather(*(self._dispatch(call) for call in calls))
+            self.last_tool_results.extend(result for result, _ in outcomes)
+            self.chat_history.append({'role': 'user', 'parts': [part for _, part in outcomes]})
+
+    def execute_turn(self, prompt_text: str) -> str:
+        """Blocking wrapper around execute_turn_async. Reuses one event loop so the async HTTP client stays valid across turns."""
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.execute_turn_async(prompt_text))
@@ -0,0 +1,134 @@
+# tools/chat_history.py
+# Keeps orchestration chat histories bounded so late turns cost about the same as early ones.
+# Completed steps are collapsed into compact summaries, large tool outputs are truncated,
+# and the oldest steps are folded into a digest whenever the request exceeds the token budget.
+import json
+import config
+
+CHARS_PER_TOKEN = 4
+DIGEST_MAX_LINES = 40
+
+def _part_fields(part):
+    """Returns (text, function_call, function_response) for a dict part or a genai Part."""
+    if isinstance(part, dict):
+        return part.get('text'), part.get('function_call'), part.get('function_response')
+    return getattr(part, 'text', None), getattr(part, 'function_call', None), getattr(part, 'function_response', None)
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def _is_text_only(message) -> bool:
+    return all(_part_fields(p)[1] is None and _part_fields(p)[2] is None for p in message.get('parts', []))
+
+def _one_line(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """Keeps the head and tail of a long string, e.g. a large list_files listing."""
+    if max_chars is None or len(text) <= max_chars: return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n... [{len(text) - max_chars} chars truncated] ...\n{text[-tail:]}"
+
+class ChatHistoryManager:
+    """
+    Owns a chat history list in place (the list object handed in stays the one that is sent).
+    The first `pinned` messages (system prompt and acknowledgement) are never compacted or dropped.
+    """
+    def __init__(self, history: list, token_budget: int = None, pinned: int = 2, max_tool_output_chars: int = None, summary_chars: int = 200):
+        self.history = history
+        self.token_budget = token_budget or getattr(config, 'CHAT_HISTORY_TOKEN_BUDGET', 32000)
+        self.max_tool_output_chars = max_tool_output_chars or getattr(config, 'CHAT_TOOL_OUTPUT_MAX_CHARS', 4000)
+        self.pinned = pinned
+        self.summary_chars = summary_chars
+        self._digest = []
+        # Local estimator calibration, refined from usage_metadata after every request.
+        self._tokens_per_estimate = 1.0
+        self.last_prompt_tokens = None
+        self.total_prompt_tokens = 0
+
+    # --- Token accounting ---
+    def _raw_estimate(self, messages) -> int:
+        chars = 0
+        for message in messages:
+            for part in message.get('parts', []):
+                text, call, resp = _part_fields(part)
+                if text: chars += len(text)
+                if call: chars += len(str(_field(call, 'name'))) + len(json.dumps(dict(_field(call, 'args') or {}), default=str))
+                if resp: chars += len(json.dumps(_field(resp, 'response') or {}, default=str))
+        return chars // CHARS_PER_TOKEN + 1
+
+    def estimate_tokens(self) -> int:
+        """Estimated prompt tokens for the current history."""
+        return int(self._raw_estimate(self.history) * self._tokens_per_estimate)
+
+    def record_usage(self, response):
+        """Calibrates the estimator against the token count the API reported for the request just sent."""
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None) if usage else None
+        if not prompt_tokens: return
+        self.last_prompt_tokens = prompt_tokens
+        self.total_prompt_tokens += prompt_tokens
+        raw = self._raw_estimate(self.history)
+        if raw: self._tokens_per_estimate = prompt_tokens / raw
+
+    # --- Compaction ---
+    def truncate_tool_output(self, text: str) -> str:
+        return truncate_text(text, self.max_tool_output_chars)
+
+    def _summarize(self, messages) -> list:
+        lines = []
+        for message in messages:
+            for part in message.get('parts', []):
+                _, call, resp = _part_fields(part)
+                if call:
+                    args = json.dumps(dict(_field(call, 'args') or {}), default=str)
+                    lines.append(f"- called {_field(call, 'name')}({truncate_text(args, self.summary_chars)})")
+                if resp:
+                    outcome = _field(resp, 'response') or {}
+                    key = 'error' if 'error' in outcome else 'result'
+                    lines.append(f"  -> {key}: {truncate_text(str(outcome.get(key)), self.summary_chars)}")
+        return lines
+
+    def compact_turn(self, prompt_message: dict):
+        """
+        Collapses a completed turn (the user `prompt_message`, tool traffic, final model text) into
+        the user prompt plus ONE model message that carries a short tool summary and the final reply.
+        """
+        turn_start = next((i for i in range(len(self.history) - 1, -1, -1) if self.history[i] is prompt_message), None)
+        if turn_start is None or turn_start < self.pinned or turn_start >= len(self.history) - 2: return
+        tool_traffic = self.history[turn_start + 1:-1]
+        final_text = "".join(_part_fields(p)[0] or "" for p in self.history[-1].get('parts', []))
+        lines = self._summarize(tool_traffic)
+        summary = "[Completed step]\n" + "\n".join(lines) + "\n" + final_text if lines else final_text
+        self.history[turn_start + 1:] = [{'role': 'model', 'parts': [{'text': summary}]}]
+
+    def _digest_messages(self) -> list:
+        del self._digest[:-DIGEST_MAX_LINES]
+        text = "Summary of earlier completed steps:\n" + "\n".join(self._digest)
+        return [{'role': 'user', 'parts': [{'text': text}]}, {'role': 'model', 'parts': [{'text': "Noted."}]}]
+
+    def enforce_budget(self):
+        """Folds the oldest completed turns into a digest until the estimate fits the token budget."""
+        start = self.pinned + (2 if self._digest else 0)
+        while self.estimate_tokens() > self.token_budget:
+            # A droppable turn is a user prompt followed by exactly one model reply, and never the live turn.
+            if len(self.history) - start < 3: break
+            user_msg, model_msg, next_msg = self.history[start:start + 3]
+            if user_msg.get('role') != 'user' or model_msg.get('role') != 'model' or next_msg.get('role') != 'user': break
+            if not (_is_text_only(user_msg) and _is_text_only(model_msg) and _is_text_only(next_msg)): break
+            prompt = "".join(_part_fields(p)[0] or "" for p in user_msg.get('parts', []))
+            reply = "".join(_part_fields(p)[0] or "" for p in model_msg.get('parts', []))
+            reply = reply.strip().splitlines()[-1] if reply.strip() else ""
+            self._digest.append(f"- {_one_line(prompt, self.summary_chars // 2)} => {_one_line(reply, self.summary_chars // 2)}")
+            del self.history[start:start + 2]
+            if start == self.pinned:
+                self.history[self.pinned:self.pinned] = self._digest_messages()
+                start = self.pinned + 2
+            else:
+                self.history[self.pinned:self.pinned + 2] = self._digest_messages()
+        # If only the digest is left to shrink, forget its oldest entries.
+        while self._digest and len(self._digest) > 1 and self.estimate_tokens() > self.token_budget:
+            self._digest.pop(0)
+            self.history[self.pinned:self.pinned + 2] = self._digest_messages()
@@ -26,4 +26,51 @@ MODELS = {
     "chirp": [
         "en-US-Chirp3-HD-Charon"
     ]
-}
\ No newline at end of file
+}
+
+# Maximum number of in-flight requests per model family, used by the production scheduler.
+CONCURRENCY_LIMITS = {
+    "gemini": 4,
+    "lyria": 2,
+    "imagen_gen": 4,
+    "imagen_edit": 4,
+    "veo": 4,
+    "chirp": 8,
+    "ffmpeg": 1
+}
+
+# Sustained request quota per model family, in requests per minute. The shared rate limiter in
+# tools/_rate_limit.py starts at these rates and backs off automatically when the API returns 429.
+RATE_LIMITS_PER_MINUTE = {
+    "gemini": 60,
+    "lyria": 10,
+    "imagen_gen": 20,
+    "imagen_edit": 20,
+    "veo": 10,
+    "chirp": 300
+}
+
+# Largest `number_of_images` each image model accepts in a single request.
+MAX_IMAGES_PER_CALL = {
+    "imagen-4.0-ultra-generate-preview-06-06": 1,
+    "imagen-4.0-generate-preview-06-06": 4,
+    "imagen-4.0-fast-generate-preview-06-06": 4,
+    "imagen-3.0-generate-002": 4,
+    "imagen-3.0-fast-generate-001": 4,
+    "imagen-3.0-capability-001": 4
+}
+
+# Longest edge (px) a model makes use of in a reference image; larger inputs are downsampled server-side.
+MAX_REFERENCE_EDGE = {
+    "imagen-3.0-capability-001": 1024,
+    "veo-2.0-generate-001": 1280,
+    "veo-2.0-generate-exp": 1280,
+    "veo-3.0-generate-preview": 1920,
+    "veo-3.0-fast-generate-preview": 1920
+}
+
+def model_family(model_name: str) -> str:
+    """Returns the MODELS family a model name belongs to, or the name itself if it is unknown."""
+    for family, names in MODELS.items():
+        if model_name in names: return family
+    return model_name
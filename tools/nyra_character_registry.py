@@ -0,0 +1,185 @@
+# tools/nyra_character_registry.py
+# Persistent registry of Digital Twin characters.
+# Each character stores its Core Identity Prompt (CIP) and master reference images. The references are
+# preprocessed per target model and uploaded ONCE at registration; their gs:// URIs are kept with an
+# expiry and only re-verified after it passes. Prebuilt SubjectReferenceImage lists are memoized per
+# process, so a panel that names a `character_id` spends no time preparing references.
+
+# --- Path Setup ---
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# ---
+
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from typing import List, Optional
+from google.genai.types import Image, SubjectReferenceImage, SubjectReferenceConfig
+from tools._helpers import resolve_path_in_workspace, upload_to_gcs, file_digests
+from tools._image_preprocess import preprocess_reference
+from tools.models import MODELS
+from tools import _schema_helper
+import config
+
+REGISTRY_PATH = Path(getattr(config, 'CHARACTER_REGISTRY_PATH', os.path.join(config.WORKSPACE_DIR, "characters", "registry.json")))
+# Uploaded references are trusted for this long before the object is checked (and re-uploaded if gone).
+REFERENCE_URI_TTL_SECONDS = getattr(config, 'CHARACTER_REFERENCE_TTL_SECONDS', 7 * 24 * 3600)
+# Imagen subject customization accepts up to four images per subject.
+MAX_SUBJECT_IMAGES = 4
+DEFAULT_PREPARE_MODELS = [MODELS["imagen_edit"][0]]
+
+_lock = threading.RLock()
+_registry = None
+_subject_refs = {}
+
+def _load() -> dict:
+    global _registry
+    if _registry is None:
+        try:
+            _registry = json.loads(REGISTRY_PATH.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            _registry = {"characters": {}}
+    return _registry
+
+def _save():
+    REGISTRY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = REGISTRY_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(_registry, indent=2), encoding='utf-8')
+    os.replace(tmp_path, REGISTRY_PATH)
+
+def _character(character_id: str) -> dict:
+    character = _load()["characters"].get(character_id)
+    if character is None: raise KeyError(f"Unknown character_id '{character_id}'. Register it with register_character first.")
+    return character
+
+def _prepare(character: dict, model_name: str) -> list:
+    """Preprocesses and uploads the character's references for one model. Returns the prepared entries."""
+    prepared = []
+    for rel_path in character["reference_paths"]:
+        source = resolve_path_in_workspace(rel_path)
+        if not source.exists(): raise FileNotFoundError(f"Reference image not found: {rel_path}")
+        local_path = preprocess_reference(source, model_name)
+        prepared.append({
+            "source": rel_path, "source_sha256": file_digests(source)[0], "prepared_path": str(local_path),
+            "gcs_uri": upload_to_gcs(local_path, f"characters/{character['character_id']}"),
+            "expires_at": time.time() + REFERENCE_URI_TTL_SECONDS
+        })
+    character.setdefault("prepared", {})[model_name] = prepared
+    return prepared
+
+def _live_entries(character_id: str, model_name: str) -> list:
+    """The prepared references for a model, refreshed if a source changed or a URI has expired."""
+    with _lock:
+        character = _character(character_id)
+        entries = character.get("prepared", {}).get(model_name)
+        stale = entries is None or any(
+            file_digests(resolve_path_in_workspace(e["source"]))[0] != e["source_sha256"] or not os.path.exists(e["prepared_path"])
+            for e in entries
+        )
+        if stale:
+            entries = _prepare(character, model_name)
+            _subject_refs.pop((character_id, model_name), None)
+            _save()
+        elif any(time.time() >= e["expires_at"] for e in entries):
+            for e in entries:
+                # upload_to_gcs checks the object and only re-uploads when it is gone.
+                e["gcs_uri"] = upload_to_gcs(Path(e["prepared_path"]), f"characters/{character_id}")
+                e["expires_at"] = time.time() + REFERENCE_URI_TTL_SECONDS
+            _subject_refs.pop((character_id, model_name), None)
+            _save()
+        return entries
+
+# --- Accessors used by the generation tools ---
+def character_prompt(character_id: str) -> str:
+    """The character's Core Identity Prompt ('' if none was registered)."""
+    with _lock:
+        return _character(character_id).get("cip", "")
+
+def with_character_prompt(prompt: Optional[str], character_id: str) -> str:
+    """Appends the character's CIP to a generation prompt."""
+    cip = character_prompt(character_id)
+    if not cip: return prompt or ""
+    return f"{prompt}\nCharacter details: {cip}" if prompt else cip
+
+def character_subject_references(character_id: str, model_name: str = None, reference_id: int = 1) -> list:
+    """Prebuilt SubjectReferenceImage objects for a character, ready to pass to edit_image."""
+    model_name = model_name or MODELS["imagen_edit"][0]
+    entries = _live_entries(character_id, model_name)
+    key = (character_id, model_name)
+    with _lock:
+        if key not in _subject_refs:
+            character = _character(character_id)
+            subject_config = SubjectReferenceConfig(subject_type=character.get("subject_type", "SUBJECT_TYPE_PERSON"), subject_description=character.get("description") or None)
+            _subject_refs[key] = [
+                SubjectReferenceImage(reference_image=Image(gcs_uri=e["gcs_uri"]), reference_id=reference_id, config=subject_config)
+                for e in entries[:MAX_SUBJECT_IMAGES]
+            ]
+        return list(_subject_refs[key])
+
+def character_image(character_id: str, model_name: str) -> Image:
+    """The character's primary reference as a genai Image prepared for `model_name` (e.g. an I2V start frame)."""
+    entry = _live_entries(character_id, model_name)[0]
+    return Image(gcs_uri=entry["gcs_uri"], mime_type="image/jpeg" if entry["prepared_path"].endswith(".jpg") else "image/png")
+
+# --- Tools ---
+def register_character(character_id: str, reference_paths: List[str], cip_text: str = None, cip_path: str = None, description: str = None, subject_type: str = "SUBJECT_TYPE_PERSON") -> str:
+    """
+    Registers (or updates) a character so other tools can use it by `character_id`.
+    Stores the Core Identity Prompt (from cip_text or the file at cip_path) and the master reference images, which are preprocessed and uploaded once.
+    """
+    print(f"\n[Tool: register_character] '{character_id}'")
+    try:
+        if not reference_paths: raise ValueError("At least one reference image is required.")
+        if cip_path and not cip_text:
+            cip_text = resolve_path_in_workspace(cip_path).read_text(encoding='utf-8').strip()
+        with _lock:
+            character = _load()["characters"].get(character_id, {})
+            character.update({
+                "character_id": character_id, "reference_paths": list(reference_paths), "subject_type": subject_type,
+                "cip": cip_text if cip_text is not None else character.get("cip", ""),
+                "description": description if description is not None else character.get("description"),
+                "prepared": {}, "updated_at": time.time()
+            })
+            for model_name in DEFAULT_PREPARE_MODELS:
+                _prepare(character, model_name)
+            _load()["characters"][character_id] = character
+            for key in [k for k in _subject_refs if k[0] == character_id]:
+                del _subject_refs[key]
+            _save()
+        message = f"Character '{character_id}' registered with {len(reference_paths)} reference image(s)."
+        print(f"✅ SUCCESS: {message}")
+        return message
+    except Exception as e:
+        print(f"❌ FAILED: register_character. Error: {e}")
+        return f"Failed to register character. Error: {e}"
+
+def list_characters() -> str:
+    """Lists the registered characters with their reference images and the start of their Core Identity Prompt."""
+    with _lock:
+        characters = _load()["characters"]
+        summary = [{"character_id": c["character_id"], "reference_paths": c["reference_paths"], "cip": c.get("cip", "")[:120]} for c in characters.values()]
+    return json.dumps(summary, indent=2) if summary else "No characters are registered."
+
+# --- TOOL REGISTRATION ---
+_TOOL_FUNCTIONS = [register_character, list_characters]
+def get_tool_declarations():
+    return [_schema_helper.create_function_declaration(f) for f in _TOOL_FUNCTIONS]
+def get_tool_registry():
+    return {f.__name__: f for f in _TOOL_FUNCTIONS}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Nyra Character Registry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    p_register = subparsers.add_parser("register", help="Register a character.")
+    p_register.add_argument("--character_id", required=True)
+    p_register.add_argument("--reference_paths", nargs="+", required=True)
+    p_register.add_argument("--cip_text"); p_register.add_argument("--cip_path"); p_register.add_argument("--description")
+    subparsers.add_parser("list", help="List registered characters.")
+    args = parser.parse_args()
+    if args.command == "register":
+        register_character(args.character_id, args.reference_paths, args.cip_text, args.cip_path, args.description)
+    else:
+        print(list_characters())
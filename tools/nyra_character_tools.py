@@ -13,7 +13,9 @@ import argparse
 from pathlib import Path
 from typing import List
 from tools._helpers import resolve_path_in_workspace
+from tools.nyra_imagen_gen import generate_image, AspectRatio
 from tools import _schema_helper
+import config
 
 # The rest of this file, including the split_and_layout_character_sheet function
 # and the tool registration block, is correct and remains unchanged.
@@ -35,7 +37,8 @@ def create_hologram_effect(input_path: str, output_path: str) -> str:
             model_name="imagen-3.0-fast-generate-001", # Changed to a valid model
             prompt=texture_prompt,
             output_path=str(temp_texture_path),
-            aspect_ratio=AspectRatio.RATIO_1_1
+            aspect_ratio=AspectRatio.RATIO_1_1,
+            cacheable=True # The texture prompt never changes, so one generation serves every call.
         )
         if not texture_result or "FAILED" in texture_result:
             raise RuntimeError(f"Failed to generate hologram texture: {texture_result}")
@@ -1,8 +1,19 @@
 # tools/nyra_chirp3.py
+# Version 2.0: Long text is split at sentence boundaries and synthesized in parallel chunks that are
+# stitched losslessly; generate_speech_batch voices every DIALOGUE layer of a production plan at once.
+# Version 2.1: Results are cached locally by normalized text, voice, encoding and speaking rate.
+import re
+import unicodedata
+import json
+import struct
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import texttospeech
-from ._helpers import resolve_path_in_workspace
-from .models import MODELS
+from ._helpers import resolve_path_in_workspace, get_tts_client
+from ._cache import ContentCache, make_cache_key
+from ._rate_limit import call_with_retry
+from .models import MODELS, CONCURRENCY_LIMITS
+import config
 
 # A list of high-quality voices for testing
 VALID_VOICES = [
@@ -12,27 +23,198 @@ VALID_VOICES = [
     "hi-IN-Wavenet-C"        # Hindi Female
 ]
 
-def generate_speech(text_to_speak: str, output_path: str, voice_name: str):
-    """Generates high-definition speech from text."""
+# The API rejects inputs over 5000 bytes; chunks stay under this with some headroom.
+MAX_CHUNK_BYTES = 4500
+DEFAULT_DIALOGUE_VOICE = "hi-IN-Wavenet-D"
+SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+SPEECH_CACHE = ContentCache("chirp_speech", getattr(config, 'SPEECH_CACHE_MAX_BYTES', 256 * 1024**2))
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC Unicode with runs of whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def split_text(text: str, max_bytes: int = MAX_CHUNK_BYTES) -> list:
+    """Splits text into chunks under max_bytes (UTF-8), breaking at sentences, then clauses, then words."""
+    def size(s): return len(s.encode('utf-8'))
+    def pieces(segment: str, splitters: list) -> list:
+        if size(segment) <= max_bytes or not splitters:
+            return [segment] if size(segment) <= max_bytes else _split_words(segment, max_bytes)
+        return [p for part in splitters[0].split(segment) for p in pieces(part, splitters[1:])]
+
+    chunks, current = [], ""
+    for piece in pieces(text.strip(), [SENTENCE_END, CLAUSE_END]):
+        if not piece: continue
+        candidate = f"{current} {piece}" if current else piece
+        if size(candidate) <= max_bytes:
+            current = candidate
+        else:
+            if current: chunks.append(current)
+            current = piece
+    if current: chunks.append(current)
+    return chunks
+
+def _split_words(segment: str, max_bytes: int) -> list:
+    words, out, current = segment.split(), [], ""
+    for word in words:
+        candidate = f"{current} {word}" if current else word
+        if len(candidate.encode('utf-8')) <= max_bytes:
+            current = candidate
+            continue
+        if current: out.append(current)
+        current = word
+        if len(word.encode('utf-8')) > max_bytes:
+            # A single word (or unspaced CJK run) over the limit: cut it at character boundaries.
+            *full, current = _split_chars(word, max_bytes)
+            out.extend(full)
+    if current: out.append(current)
+    return out
+
+def _split_chars(word: str, max_bytes: int) -> list:
+    out, current, current_size = [], "", 0
+    for char in word:
+        char_size = len(char.encode('utf-8'))
+        if current and current_size + char_size > max_bytes:
+            out.append(current)
+            current, current_size = "", 0
+        current, current_size = current + char, current_size + char_size
+    return out + [current]
+
+# --- Lossless stitching ---
+def _strip_id3(data: bytes) -> bytes:
+    """Drops a leading ID3v2 tag so concatenated MP3 chunks are a clean run of frames."""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        tag_size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return data[10 + tag_size:]
+    return data
+
+def _wav_pcm(data: bytes) -> tuple:
+    """Returns (fmt chunk body, PCM data) from a RIFF/WAVE payload."""
+    pos, fmt, pcm = 12, None, b""
+    while pos + 8 <= len(data):
+        chunk_id, chunk_size = data[pos:pos + 4], struct.unpack('<I', data[pos + 4:pos + 8])[0]
+        body = data[pos + 8:pos + 8 + chunk_size]
+        if chunk_id == b"fmt ": fmt = body
+        elif chunk_id == b"data": pcm = body
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return fmt, pcm
+
+def stitch_audio(chunks: list, encoding: str) -> bytes:
+    """Joins synthesized chunks without decoding: MP3 frames are concatenated, LINEAR16 PCM gets one new header."""
+    if len(chunks) == 1: return chunks[0]
+    if encoding == "MP3":
+        return chunks[0] + b"".join(_strip_id3(c) for c in chunks[1:])
+    fmt, _ = _wav_pcm(chunks[0])
+    pcm = b"".join(_wav_pcm(c)[1] for c in chunks)
+    return b"RIFF" + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(pcm)) + b"WAVE" + b"fmt " + struct.pack('<I', len(fmt)) + fmt + b"data" + struct.pack('<I', len(pcm)) + pcm
+
+# --- Synthesis ---
+def _encoding_for(output_path: str) -> str:
+    return "LINEAR16" if str(output_path).lower().endswith(".wav") else "MP3"
+
+def _synthesize(text: str, voice_name: str, encoding: str, speaking_rate: float = 1.0, pool: ThreadPoolExecutor = None) -> bytes:
+    """Synthesizes text of any length on the shared client; long text is chunked and chunks run in parallel."""
+    client = get_tts_client()
+    voice = texttospeech.VoiceSelectionParams(language_code='-'.join(voice_name.split('-')[:2]), name=voice_name)
+    audio_config = texttospeech.AudioConfig(audio_encoding=getattr(texttospeech.AudioEncoding, encoding), speaking_rate=speaking_rate)
+    def synthesize_chunk(chunk: str) -> bytes:
+        synthesis_input = texttospeech.SynthesisInput(text=chunk)
+        return call_with_retry("chirp", client.synthesize_speech, input=synthesis_input, voice=voice, audio_config=audio_config).audio_content
+    chunks = split_text(normalize_text(text))
+    if len(chunks) == 1:
+        return synthesize_chunk(chunks[0])
+    print(f" -> Long text split into {len(chunks)} chunks at sentence boundaries.")
+    if pool is not None:
+        return stitch_audio(list(pool.map(synthesize_chunk, chunks)), encoding)
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY_LIMITS["chirp"], len(chunks))) as chunk_pool:
+        return stitch_audio(list(chunk_pool.map(synthesize_chunk, chunks)), encoding)
+
+def _synthesize_to(text: str, output_path: str, voice_name: str, speaking_rate: float = 1.0, pool: ThreadPoolExecutor = None) -> tuple:
+    """Writes speech for text to output_path, from the local cache when possible. Returns (path, cache_hit)."""
+    encoding = _encoding_for(output_path)
+    local_path = resolve_path_in_workspace(output_path)
+    cache_key = make_cache_key(text=normalize_text(text), voice_name=voice_name, encoding=encoding, speaking_rate=float(speaking_rate))
+    cached_path = SPEECH_CACHE.get(cache_key, local_path)
+    if cached_path: return cached_path, True
+    audio = _synthesize(text, voice_name, encoding, speaking_rate, pool)
+    # The old file may be a hard link into the cache; replace it rather than writing through it.
+    local_path.unlink(missing_ok=True)
+    local_path.write_bytes(audio)
+    SPEECH_CACHE.put(cache_key, local_path, meta={"voice_name": voice_name, "text": normalize_text(text)[:200]})
+    return str(local_path), False
+
+def get_speech_cache_stats() -> dict:
+    """Entry count, size and hit/miss counters of the local speech cache."""
+    return SPEECH_CACHE.stats()
+
+def generate_speech(text_to_speak: str, output_path: str, voice_name: str, speaking_rate: float = 1.0):
+    """
+    Generates high-definition speech from text. Text of any length is accepted; a '.wav' output_path produces LINEAR16 audio.
+    Identical requests (same normalized text, voice, encoding and speaking_rate) are served from the local cache.
+    """
     print(f"\n[Tool: generate_speech] with voice '{voice_name}'")
     try:
-        client = texttospeech.TextToSpeechClient()
-        synthesis_input = texttospeech.SynthesisInput(text=text_to_speak)
-        voice = texttospeech.VoiceSelectionParams(language_code='-'.join(voice_name.split('-')[:2]), name=voice_name)
-        audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-        response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-        local_path = resolve_path_in_workspace(output_path)
-        local_path.write_bytes(response.audio_content)
-        print(f"✅ SUCCESS: Speech saved to {local_path}")
-        return str(local_path)
+        local_path, cache_hit = _synthesize_to(text_to_speak, output_path, voice_name, speaking_rate)
+        print(f"✅ SUCCESS: Speech {'served from local cache' if cache_hit else 'saved'} to {local_path}")
+        return local_path
     except Exception as e:
         print(f"❌ FAILED: generate_speech. Error: {e}")
         return None
 
+def generate_speech_batch(plan_path: str, output_dir: str, default_voice: str = DEFAULT_DIALOGUE_VOICE) -> str:
+    """
+    Synthesizes every DIALOGUE audio layer of a production plan concurrently on the shared TTS client.
+    Files are named like the production graph expects ('shot_NN_audio_I_dialogue.mp3'). Returns a JSON status per line.
+    """
+    print(f"\n[Tool: generate_speech_batch] for plan '{plan_path}'")
+    try:
+        plan = json.loads(resolve_path_in_workspace(plan_path).read_text(encoding='utf-8'))
+        jobs = []
+        for shot in plan['shots']:
+            for i, layer in enumerate(shot['audio_layers']):
+                if layer['layer_type'] != "DIALOGUE": continue
+                jobs.append({
+                    "shot_number": shot['shot_number'], "text": layer['prompt'],
+                    "voice_name": layer.get('voice_name') or default_voice,
+                    "output_path": f"{output_dir}/shot_{shot['shot_number']:02d}_audio_{i+1}_dialogue.mp3"
+                })
+        if not jobs: return json.dumps({"succeeded": 0, "failed": 0, "items": []})
+        print(f" -> {len(jobs)} dialogue line(s) to synthesize.")
+
+        workers = min(CONCURRENCY_LIMITS["chirp"], len(jobs))
+        # Lines and the chunks of long lines share one bounded pool of in-flight requests.
+        with ThreadPoolExecutor(max_workers=workers) as chunk_pool:
+            def run_job(job: dict) -> dict:
+                item = {"shot_number": job["shot_number"], "output_path": job["output_path"], "voice_name": job["voice_name"]}
+                try:
+                    _, item["cached"] = _synthesize_to(job["text"], job["output_path"], job["voice_name"], pool=chunk_pool)
+                    item["status"] = "ok"
+                except Exception as e:
+                    item.update(status="failed", error=str(e))
+                return item
+            with ThreadPoolExecutor(max_workers=workers) as line_pool:
+                items = list(line_pool.map(run_job, jobs))
+
+        succeeded = sum(1 for item in items if item["status"] == "ok")
+        cached = sum(1 for item in items if item.get("cached"))
+        print(f"{'✅ SUCCESS' if succeeded == len(items) else '⚠️ PARTIAL'}: {succeeded}/{len(items)} dialogue lines synthesized ({cached} from cache).")
+        return json.dumps({"succeeded": succeeded, "failed": len(items) - succeeded, "items": items})
+    except Exception as e:
+        print(f"❌ FAILED: generate_speech_batch. Error: {e}")
+        return None
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Chirp-3 Speech Generation")
-    parser.add_argument("--text", required=True, help="The text to synthesize.")
-    parser.add_argument("--output_path", required=True, help="Local path to save the MP3 file.")
+    parser.add_argument("--text", help="The text to synthesize.")
+    parser.add_argument("--output_path", help="Local path to save the MP3 (or .wav) file.")
     parser.add_argument("--voice_name", default=VALID_VOICES[0], choices=VALID_VOICES, help="The voice model to use.")
+    parser.add_argument("--speaking_rate", type=float, default=1.0, help="Speaking rate (0.25 to 4.0).")
+    parser.add_argument("--plan_path", help="Synthesize every DIALOGUE layer of this production plan instead.")
+    parser.add_argument("--output_dir", help="Directory for --plan_path output files.")
     args = parser.parse_args()
-    generate_speech(args.text, args.output_path, args.voice_name)
\ No newline at end of file
+    if args.plan_path:
+        if not args.output_dir: parser.error("--output_dir is required with --plan_path.")
+        generate_speech_batch(args.plan_path, args.output_dir)
+    else:
+        if not args.text or not args.output_path: parser.error("--text and --output_path are required.")
+        generate_speech(args.text, args.output_path, args.voice_name, args.speaking_rate)
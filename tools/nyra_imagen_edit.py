@@ -1,62 +1,133 @@
 # tools/nyra_imagen_edit.py
 # Definitive Version 2.0: Upgraded to the self-registering module standard.
+# Version 2.1: Adds batch_edit_images for running many edits concurrently with shared references.
+# Version 2.2: Accepts a registered character_id in place of reference paths.
 # --- Path Setup for Direct Execution ---
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # ---
+import json
 import argparse
-from typing import Optional
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
 from enum import Enum
-from google import genai
-from google.genai.types import (Image, RawReferenceImage, MaskReferenceImage, MaskReferenceConfig, EditImageConfig, StyleReferenceImage, StyleReferenceConfig, SubjectReferenceImage, SubjectReferenceConfig, ControlReferenceImage, ControlReferenceConfig)
-from tools._helpers import resolve_path_in_workspace, upload_to_gcs
-from tools.models import MODELS
+from google.genai.types import (RawReferenceImage, MaskReferenceImage, MaskReferenceConfig, EditImageConfig, StyleReferenceImage, StyleReferenceConfig, SubjectReferenceImage, SubjectReferenceConfig, ControlReferenceImage, ControlReferenceConfig)
+from tools._helpers import resolve_path_in_workspace, get_genai_client
+from tools._image_transport import image_reference
+from tools.nyra_character_registry import character_subject_references, character_image, with_character_prompt
+from tools._rate_limit import call_with_retry
+from tools.models import MODELS, CONCURRENCY_LIMITS
 from tools import _schema_helper
-import config
 class EditMode(str, Enum):
     SUBJECT = "subject"; STYLE = "style"; SCRIBBLE = "scribble"; BGSWAP = "bgswap"; INPAINT = "inpaint"
 
-def edit_image(edit_mode: EditMode, output_path: str, prompt: str = "", negative_prompt: Optional[str] = None, input_path: Optional[str] = None, style_ref_path: Optional[str] = None, subject_ref_path: Optional[str] = None, scribble_ref_path: Optional[str] = None, mask_path: Optional[str] = None) -> str:
-    """A unified multi-tool for advanced image editing, with enforced modes."""
+MODE_MAP = {
+    EditMode.SUBJECT: "EDIT_MODE_DEFAULT", EditMode.STYLE: "EDIT_MODE_DEFAULT",
+    EditMode.SCRIBBLE: "EDIT_MODE_CONTROLLED_EDITING", EditMode.BGSWAP: "EDIT_MODE_BGSWAP",
+    EditMode.INPAINT: "EDIT_MODE_INPAINT_INSERTION"
+}
+
+def _load_reference(path: str, ref_type: str):
+    resolved_path = resolve_path_in_workspace(path)
+    if not os.path.exists(resolved_path): raise FileNotFoundError(f"Prerequisite file not found: {path}")
+    kind = {"mask": "mask", "scribble": "control"}.get(ref_type, "image")
+    return image_reference(resolved_path, f"edit_inputs/{ref_type}", model_name=MODELS["imagen_edit"][0], kind=kind)
+
+def _run_edit(mode_enum: EditMode, output_path: str, prompt: str, negative_prompt: Optional[str], path_map: dict, load_reference=_load_reference, character_id: Optional[str] = None) -> str:
+    """Builds the reference list for one edit, calls the API and saves the result. Raises on failure."""
+    gcp_client = get_genai_client()
+    sdk_edit_mode = MODE_MAP[mode_enum]
+    reference_images = []
+    if character_id:
+        # Registered references are already preprocessed and uploaded; no per-call preparation.
+        prompt = with_character_prompt(prompt, character_id)
+        if mode_enum == EditMode.SUBJECT and not path_map.get("subject"):
+            reference_images.extend(character_subject_references(character_id, MODELS["imagen_edit"][0]))
+        elif not path_map.get("input") and mode_enum != EditMode.SUBJECT:
+            reference_images.append(RawReferenceImage(reference_image=character_image(character_id, MODELS["imagen_edit"][0]), reference_id=0))
+    for ref_type, path in path_map.items():
+        if path:
+            image_obj = load_reference(path, ref_type)
+            if ref_type == "input": reference_images.append(RawReferenceImage(reference_image=image_obj, reference_id=0))
+            elif ref_type == "style": reference_images.append(StyleReferenceImage(reference_image=image_obj, reference_id=1, config=StyleReferenceConfig(style_description="the provided style")))
+            elif ref_type == "subject": reference_images.append(SubjectReferenceImage(reference_image=image_obj, reference_id=1, config=SubjectReferenceConfig(subject_type="SUBJECT_TYPE_PERSON")))
+            elif ref_type == "scribble": reference_images.append(ControlReferenceImage(reference_image=image_obj, config=ControlReferenceConfig(control_type="CONTROL_TYPE_SCRIBBLE"), reference_id=2))
+            elif ref_type == "mask": reference_images.append(MaskReferenceImage(reference_image=image_obj, reference_id=1))
+    if sdk_edit_mode == "EDIT_MODE_BGSWAP":
+        reference_images.append(MaskReferenceImage(config=MaskReferenceConfig(mask_mode="MASK_MODE_BACKGROUND"), reference_id=1))
+    edit_config = EditImageConfig(edit_mode=sdk_edit_mode, negative_prompt=negative_prompt)
+    response = call_with_retry(MODELS["imagen_edit"][0], gcp_client.models.edit_image, model=MODELS["imagen_edit"][0], prompt=prompt, reference_images=reference_images, config=edit_config)
+    if not response.generated_images: raise ValueError("The API returned no image (the prompt may have been filtered).")
+    local_path = resolve_path_in_workspace(output_path)
+    # The old file may be a hard link into the cache; replace it rather than writing through it.
+    local_path.unlink(missing_ok=True)
+    response.generated_images[0].image.save(str(local_path))
+    return str(local_path)
+
+def edit_image(edit_mode: EditMode, output_path: str, prompt: str = "", negative_prompt: Optional[str] = None, input_path: Optional[str] = None, style_ref_path: Optional[str] = None, subject_ref_path: Optional[str] = None, scribble_ref_path: Optional[str] = None, mask_path: Optional[str] = None, character_id: Optional[str] = None) -> str:
+    """A unified multi-tool for advanced image editing, with enforced modes. A registered character_id can replace subject_ref_path (subject mode) or input_path (other modes)."""
     try:
         mode_enum = EditMode(edit_mode)
         print(f"\n[Tool: edit_image] with mode '{mode_enum.value}'")
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
-        mode_map = {
-            EditMode.SUBJECT: "EDIT_MODE_DEFAULT", EditMode.STYLE: "EDIT_MODE_DEFAULT",
-            EditMode.SCRIBBLE: "EDIT_MODE_CONTROLLED_EDITING", EditMode.BGSWAP: "EDIT_MODE_BGSWAP",
-            EditMode.INPAINT: "EDIT_MODE_INPAINT_INSERTION"
-        }
-        sdk_edit_mode = mode_map[mode_enum]
-        reference_images = []
         path_map = {"input": input_path, "style": style_ref_path, "subject": subject_ref_path, "scribble": scribble_ref_path, "mask": mask_path}
-        for ref_type, path in path_map.items():
-            if path:
-                resolved_path = resolve_path_in_workspace(path)
-                if not os.path.exists(resolved_path): raise FileNotFoundError(f"Prerequisite file not found: {path}")
-                gcs_uri = upload_to_gcs(resolved_path, f"edit_inputs/{ref_type}")
-                image_obj = Image(gcs_uri=gcs_uri)
-                if ref_type == "input": reference_images.append(RawReferenceImage(reference_image=image_obj, reference_id=0))
-                elif ref_type == "style": reference_images.append(StyleReferenceImage(reference_image=image_obj, reference_id=1, config=StyleReferenceConfig(style_description="the provided style")))
-                elif ref_type == "subject": reference_images.append(SubjectReferenceImage(reference_image=image_obj, reference_id=1, config=SubjectReferenceConfig(subject_type="SUBJECT_TYPE_PERSON")))
-                elif ref_type == "scribble": reference_images.append(ControlReferenceImage(reference_image=image_obj, config=ControlReferenceConfig(control_type="CONTROL_TYPE_SCRIBBLE"), reference_id=2))
-                elif ref_type == "mask": reference_images.append(MaskReferenceImage(reference_image=image_obj, reference_id=1))
-        if sdk_edit_mode == "EDIT_MODE_BGSWAP":
-            reference_images.append(MaskReferenceImage(config=MaskReferenceConfig(mask_mode="MASK_MODE_BACKGROUND"), reference_id=1))
-        edit_config = EditImageConfig(edit_mode=sdk_edit_mode, negative_prompt=negative_prompt)
-        response = gcp_client.models.edit_image(model=MODELS["imagen_edit"][0], prompt=prompt, reference_images=reference_images, config=edit_config)
-        edited_img = response.generated_images[0]
-        local_path = resolve_path_in_workspace(output_path)
-        edited_img.image.save(str(local_path))
+        local_path = _run_edit(mode_enum, output_path, prompt, negative_prompt, path_map, character_id=character_id)
         print(f"✅ SUCCESS: Edited image saved to {local_path}")
         return str(local_path)
     except Exception as e:
         print(f"❌ FAILED: edit_image. Error: {e}")
         return str(e)
 
+def batch_edit_images(edit_mode: EditMode, prompts: List[str], output_paths: List[str], input_paths: List[str] = None, edit_modes: List[str] = None, mask_paths: List[str] = None, negative_prompt: Optional[str] = None, style_ref_path: Optional[str] = None, subject_ref_path: Optional[str] = None, scribble_ref_path: Optional[str] = None, character_id: Optional[str] = None) -> str:
+    """
+    Runs many edit_image jobs concurrently in one tool call, e.g. every panel of a storyboard.
+    Job i uses prompts[i], output_paths[i] and, if given, input_paths[i], mask_paths[i] and edit_modes[i] (default: edit_mode).
+    The style/subject/scribble references and the registered character_id are shared by all jobs and uploaded once. Returns a JSON status for every job; a failed job does not stop the others.
+    """
+    print(f"\n[Tool: batch_edit_images] {len(prompts)} job(s)")
+    try:
+        if len(output_paths) != len(prompts): raise ValueError("'prompts' and 'output_paths' must have the same length.")
+        for name, values in (("input_paths", input_paths), ("edit_modes", edit_modes), ("mask_paths", mask_paths)):
+            if values is not None and len(values) != len(prompts): raise ValueError(f"'{name}' must have one entry per prompt.")
+
+        # Each distinct reference is preprocessed and uploaded once, however many jobs use it.
+        references, reference_locks = {}, defaultdict(threading.Lock)
+        def shared_reference(path: str, ref_type: str):
+            key = (str(resolve_path_in_workspace(path)), ref_type)
+            with reference_locks[key]:
+                if key not in references:
+                    references[key] = _load_reference(path, ref_type)
+                return references[key]
+
+        def run_job(i: int) -> dict:
+            item = {"index": i + 1, "output_path": output_paths[i]}
+            try:
+                mode_enum = EditMode(edit_modes[i] if edit_modes and edit_modes[i] else edit_mode)
+                path_map = {
+                    "input": input_paths[i] if input_paths else None, "style": style_ref_path, "subject": subject_ref_path,
+                    "scribble": scribble_ref_path, "mask": mask_paths[i] if mask_paths else None
+                }
+                item["path"] = _run_edit(mode_enum, output_paths[i], prompts[i], negative_prompt, path_map, shared_reference, character_id)
+                item["status"] = "ok"
+            except Exception as e:
+                item.update(status="failed", error=str(e))
+                print(f"  -> Job {i + 1} failed: {e}")
+            return item
+
+        with ThreadPoolExecutor(max_workers=max(1, min(CONCURRENCY_LIMITS["imagen_edit"], len(prompts)))) as pool:
+            items = list(pool.map(run_job, range(len(prompts))))
+
+        succeeded = sum(1 for item in items if item["status"] == "ok")
+        print(f"{'✅ SUCCESS' if succeeded == len(items) else '⚠️ PARTIAL'}: {succeeded}/{len(items)} edits completed.")
+        return json.dumps({"succeeded": succeeded, "failed": len(items) - succeeded, "items": items})
+    except Exception as e:
+        print(f"❌ FAILED: batch_edit_images. Error: {e}")
+        return str(e)
+
 # --- TOOL REGISTRATION ---
-_TOOL_FUNCTIONS = [edit_image]
+_TOOL_FUNCTIONS = [edit_image, batch_edit_images]
 def get_tool_declarations():
     return [_schema_helper.create_function_declaration(f) for f in _TOOL_FUNCTIONS]
 def get_tool_registry():
@@ -68,6 +139,6 @@ if __name__ == '__main__':
     parser.add_argument("--mode", required=True, type=EditMode, choices=list(EditMode))
     parser.add_argument("--output_path", required=True); parser.add_argument("--prompt", default=""); parser.add_argument("--input_path")
     parser.add_argument("--style_ref_path"); parser.add_argument("--subject_ref_path"); parser.add_argument("--scribble_ref_path")
-    parser.add_argument("--mask_path"); parser.add_argument("--negative_prompt")
+    parser.add_argument("--mask_path"); parser.add_argument("--negative_prompt"); parser.add_argument("--character_id")
     args = parser.parse_args()
     edit_image(**vars(args))
\ No newline at end of file
@@ -1,6 +1,8 @@
 # tools/nyra_imagen_gen.py
 # Definitive Version 7.0: Reverted to the simple, stable genai.Client method
 # as documented in the project guides. All incorrect ControlNet logic has been removed.
+# Version 7.1: Seeded or explicitly cacheable requests are served from a local result cache.
+# Version 7.2: Adds generate_image_batch, which packs variants into multi-image requests and fans them out.
 
 # --- Path Setup ---
 import os
@@ -8,53 +10,79 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # ---
 
+import json
 import argparse
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
 from enum import Enum
-from google import genai
 import google.genai.types as genai_types
-from tools._helpers import resolve_path_in_workspace
-from tools.models import MODELS
+from tools._helpers import resolve_path_in_workspace, get_genai_client
+from tools._rate_limit import call_with_retry
+from tools._cache import ContentCache, make_cache_key
+from tools.models import MODELS, MAX_IMAGES_PER_CALL, CONCURRENCY_LIMITS
 from tools import _schema_helper
 import config
 
 class AspectRatio(str, Enum):
     RATIO_16_9 = "16:9"; RATIO_9_16 = "9:16"; RATIO_1_1 = "1:1"; RATIO_4_3 = "4:3"; RATIO_3_4 = "3:4"
 
-def generate_image(model_name: str, prompt: str, output_path: str, aspect_ratio: AspectRatio, add_watermark: bool = False, negative_prompt: Optional[str] = None, seed: Optional[int] = None):
+def _request_images(model_name: str, prompt: str, number_of_images: int, ratio_value: str, add_watermark: bool, negative_prompt: Optional[str], seed: Optional[int]) -> list:
+    """Sends one generate_images request and returns its generated_images."""
+    # Shared genai.Client from the process-wide registry in _helpers.
+    gcp_client = get_genai_client()
+
+    config_params = {
+        "number_of_images": number_of_images,
+        "aspect_ratio": ratio_value,
+        "add_watermark": add_watermark,
+        "seed": seed,
+        "negative_prompt": negative_prompt
+    }
+
+    # Use a dictionary to filter out None values to keep the call clean
+    final_config = {k: v for k, v in config_params.items() if v is not None}
+
+    response = call_with_retry(
+        model_name, gcp_client.models.generate_images,
+        model=model_name,
+        prompt=prompt,
+        config=genai_types.GenerateImagesConfig(**final_config)
+    )
+    if not response.generated_images:
+        raise ValueError("The API returned no images (the prompt may have been filtered).")
+    return response.generated_images
+
+# Results of identical requests, keyed on everything that determines the image.
+IMAGE_CACHE = ContentCache("imagen_gen", getattr(config, 'IMAGE_CACHE_MAX_BYTES', 2 * 1024**3))
+
+def generate_image(model_name: str, prompt: str, output_path: str, aspect_ratio: AspectRatio, add_watermark: bool = False, negative_prompt: Optional[str] = None, seed: Optional[int] = None, cacheable: bool = False):
     """
     Generates an image from a text prompt using the stable genai.Client.
+    Requests with a seed, or with cacheable=True, are served from the local result cache when the same request was made before.
     """
     print(f"\n[Tool: generate_image] with model '{model_name}'")
     try:
-        # DEFINITIVE FIX: Use the simple and correct genai.Client as per the documentation.
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
-        
         if isinstance(aspect_ratio, Enum):
             ratio_value = aspect_ratio.value
         else:
             ratio_value = str(aspect_ratio)
 
-        config_params = {
-            "number_of_images": 1,
-            "aspect_ratio": ratio_value,
-            "add_watermark": add_watermark,
-            "seed": seed,
-            "negative_prompt": negative_prompt
-        }
-        
-        # Use a dictionary to filter out None values to keep the call clean
-        final_config = {k: v for k, v in config_params.items() if v is not None}
-
-        response = gcp_client.models.generate_images(
-            model=model_name,
-            prompt=prompt,
-            config=genai_types.GenerateImagesConfig(**final_config)
-        )
-        
-        img = response.generated_images[0]
+        # Unseeded requests are only reused when the caller opts in; each one is a fresh sample otherwise.
+        cache_key = None
+        if seed is not None or cacheable:
+            cache_key = make_cache_key(model_name=model_name, prompt=prompt, negative_prompt=negative_prompt, seed=seed, aspect_ratio=ratio_value, add_watermark=add_watermark)
+            cached_path = IMAGE_CACHE.get(cache_key, resolve_path_in_workspace(output_path))
+            if cached_path:
+                print(f"✅ SUCCESS: Image served from local cache to {cached_path}")
+                return cached_path
+
+        img = _request_images(model_name, prompt, 1, ratio_value, add_watermark, negative_prompt, seed)[0]
         local_path = resolve_path_in_workspace(output_path)
+        # The old file may be a hard link into the cache; replace it rather than writing through it.
+        local_path.unlink(missing_ok=True)
         img.image.save(str(local_path))
+        if cache_key:
+            IMAGE_CACHE.put(cache_key, local_path, meta={"model_name": model_name, "prompt": prompt[:200]})
         
         print(f"✅ SUCCESS: Image saved directly to {local_path}")
         return str(local_path)
@@ -62,9 +90,66 @@ def generate_image(model_name: str, prompt: str, output_path: str, aspect_ratio:
         print(f"❌ FAILED: generate_image. Error: {e}")
         return None
 
+def generate_image_batch(model_name: str, output_dir: str, aspect_ratio: AspectRatio, prompts: List[str] = None, prompt: str = None, variants_per_prompt: int = 1, file_prefix: str = "image", add_watermark: bool = False, negative_prompt: Optional[str] = None, seed: Optional[int] = None) -> str:
+    """
+    Generates several images in one tool call: a list of prompts and/or several variants of each prompt.
+    Variants are packed into as few requests as the model allows and the requests run concurrently.
+    Files are named '<file_prefix>_p<NN>_v<NN>.png' in output_dir. Returns a JSON manifest of every image.
+    """
+    print(f"\n[Tool: generate_image_batch] with model '{model_name}'")
+    try:
+        all_prompts = list(prompts or []) + ([prompt] if prompt else [])
+        if not all_prompts: raise ValueError("Provide 'prompts' and/or 'prompt'.")
+        if variants_per_prompt < 1: raise ValueError(f"variants_per_prompt must be at least 1, got {variants_per_prompt}.")
+        ratio_value = aspect_ratio.value if isinstance(aspect_ratio, Enum) else str(aspect_ratio)
+        per_call = MAX_IMAGES_PER_CALL.get(model_name, 1)
+
+        # One job per request: (prompt index, first variant index, number of images).
+        jobs = []
+        for p_idx in range(len(all_prompts)):
+            for first in range(0, variants_per_prompt, per_call):
+                jobs.append((p_idx, first, min(per_call, variants_per_prompt - first)))
+        print(f" -> {len(all_prompts)} prompt(s) x {variants_per_prompt} variant(s) packed into {len(jobs)} request(s).")
+
+        def run_job(job_index, job):
+            p_idx, first, count = job
+            # Distinct, reproducible seeds per request when a base seed is given.
+            job_seed = seed + job_index if seed is not None else None
+            entries = []
+            try:
+                images = _request_images(model_name, all_prompts[p_idx], count, ratio_value, add_watermark, negative_prompt, job_seed)
+            except Exception as e:
+                return [{"prompt_index": p_idx + 1, "variant": first + i + 1, "prompt": all_prompts[p_idx], "error": str(e)} for i in range(count)]
+            for i in range(count):
+                entry = {"prompt_index": p_idx + 1, "variant": first + i + 1, "prompt": all_prompts[p_idx], "seed": job_seed}
+                if i < len(images):
+                    rel_path = f"{output_dir}/{file_prefix}_p{p_idx + 1:02d}_v{first + i + 1:02d}.png"
+                    local_path = resolve_path_in_workspace(rel_path)
+                    local_path.unlink(missing_ok=True)  # never write through a hard link into the cache
+                    images[i].image.save(str(local_path))
+                    entry["path"] = rel_path
+                else:
+                    entry["error"] = "Image was filtered or not returned by the API."
+                entries.append(entry)
+            return entries
+
+        with ThreadPoolExecutor(max_workers=max(1, min(CONCURRENCY_LIMITS["imagen_gen"], len(jobs)))) as pool:
+            images = [entry for entries in pool.map(run_job, range(len(jobs)), jobs) for entry in entries]
+
+        succeeded = sum(1 for e in images if "path" in e)
+        manifest = {"model_name": model_name, "aspect_ratio": ratio_value, "requests": len(jobs), "succeeded": succeeded, "failed": len(images) - succeeded, "images": images}
+        manifest_path = resolve_path_in_workspace(f"{output_dir}/{file_prefix}_manifest.json")
+        manifest_path.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+        if not succeeded: raise RuntimeError(f"All {len(images)} images failed. First error: {images[0].get('error')}")
+        print(f"✅ SUCCESS: {succeeded}/{len(images)} images saved to {output_dir} (manifest: {manifest_path.name})")
+        return json.dumps(manifest)
+    except Exception as e:
+        print(f"❌ FAILED: generate_image_batch. Error: {e}")
+        return None
+
 # --- TOOL REGISTRATION AND CLI ---
 # (The 'controlnet_skeleton_path' argument is removed from the tool signature and CLI)
-_TOOL_FUNCTIONS = [generate_image]
+_TOOL_FUNCTIONS = [generate_image, generate_image_batch]
 def get_tool_declarations():
     return [_schema_helper.create_function_declaration(f) for f in _TOOL_FUNCTIONS]
 def get_tool_registry():
@@ -79,5 +164,6 @@ if __name__ == '__main__':
     parser.add_argument("--add_watermark", action='store_true')
     parser.add_argument("--negative_prompt")
     parser.add_argument("--seed", type=int)
+    parser.add_argument("--cacheable", action='store_true', help="Reuse a cached result for an identical unseeded request.")
     args = parser.parse_args()
     generate_image(**vars(args))
\ No newline at end of file
@@ -1,45 +1,246 @@
 # tools/nyra_lyria.py
+# Version 2.0: Requests go through the shared authorized session (cached credentials, pooled connections,
+# timeouts). The response is streamed and each sample's base64 audio is decoded to disk in chunks, with
+# the samples of a multi-sample request written in parallel.
+# Version 2.1: Scores longer than one segment are generated as overlapping segments in parallel and joined
+# locally with loudness matching and equal-power crossfades; finished segments survive retries.
+import os
+import math
+import json
+import wave
+import queue
+import shutil
 import argparse
 import base64
-import requests
 import time
-import google.auth
-import google.auth.transport.requests
-from ._helpers import resolve_path_in_workspace
-from .models import MODELS
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from ._helpers import resolve_path_in_workspace, get_lyria_session
+from ._rate_limit import call_with_retry
+from .models import MODELS, CONCURRENCY_LIMITS
 import config
 
-def generate_music(prompt: str, output_path: str, duration_seconds: int = 20):
-    """Generates music via a direct REST call."""
+# (connect, read) timeouts; generation itself happens before the first response byte.
+LYRIA_TIMEOUT = getattr(config, 'LYRIA_TIMEOUT_SECONDS', (10, 300))
+STREAM_CHUNK_BYTES = 256 * 1024
+# How long a put to a sample writer waits before checking that the writer is still alive.
+WRITER_PUT_TIMEOUT = 1.0
+AUDIO_FIELD = b'"bytesBase64Encoded"'
+# Long-form scores: Lyria produces clips of about this length, so longer scores are split into segments.
+SEGMENT_SECONDS = getattr(config, 'LYRIA_SEGMENT_SECONDS', 30)
+SEGMENT_OVERLAP_SECONDS = 2
+SEGMENT_ATTEMPTS = 3
+# Segment gains are pulled toward the median loudness, but never by more than this.
+MAX_GAIN_DB = 6.0
+
+def _sample_paths(output_path: str, sample_count: int) -> list:
+    stem, ext = os.path.splitext(output_path)
+    return [output_path] + [f"{stem}_{i}{ext}" for i in range(2, sample_count + 1)]
+
+def _write_sample(chunks: queue.Queue, local_path) -> int:
+    """Decodes base64 pieces from the queue into local_path until a None sentinel. Returns bytes written."""
+    written, carry, error = 0, b"", None
+    with open(local_path, 'wb') as f:
+        while (piece := chunks.get()) is not None:
+            if error: continue  # keep draining so the reader never blocks on a full queue
+            try:
+                data = carry + piece.replace(b"\\", b"")  # JSON may escape '/' as '\/'
+                usable = len(data) - len(data) % 4
+                carry = data[usable:]
+                if usable:
+                    written += f.write(base64.b64decode(data[:usable]))
+            except Exception as e:
+                error = e
+        if error: raise error
+        if carry:
+            written += f.write(base64.b64decode(carry + b"=" * (-len(carry) % 4)))
+    return written
+
+def _feed(chunks: queue.Queue, writer_future, piece):
+    """Queues a piece for a sample writer; raises instead of blocking forever once the writer has stopped."""
+    while True:
+        if writer_future.done():
+            writer_future.result()  # re-raises the writer's error (e.g. the output path cannot be opened)
+            raise ValueError("Audio writer stopped before its payload ended.")
+        try:
+            chunks.put(piece, timeout=WRITER_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            continue
+
+def _stream_predictions(response, output_paths: list, pool: ThreadPoolExecutor) -> list:
+    """
+    Scans a streamed :predict response for each prediction's audio field and hands its base64 to a
+    writer on the pool, so the whole payload is never held in memory. Returns the written paths.
+    """
+    buffer, writer, futures = b"", None, []
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+            buffer += chunk
+            while buffer:
+                if writer is None:
+                    start = buffer.find(AUDIO_FIELD)
+                    if start < 0:
+                        buffer = buffer[-len(AUDIO_FIELD):]  # keep a tail in case the key spans chunks
+                        break
+                    quote = buffer.find(b'"', start + len(AUDIO_FIELD))
+                    if quote < 0:
+                        buffer = buffer[start:]
+                        break
+                    if len(futures) == len(output_paths):
+                        raise ValueError("API response contained more predictions than requested.")
+                    writer = queue.Queue(maxsize=16)
+                    local_path = resolve_path_in_workspace(output_paths[len(futures)])
+                    futures.append((pool.submit(_write_sample, writer, local_path), local_path))
+                    buffer = buffer[quote + 1:]
+                else:
+                    end = buffer.find(b'"')
+                    _feed(writer, futures[-1][0], buffer if end < 0 else buffer[:end])
+                    if end < 0:
+                        buffer = b""
+                        break
+                    _feed(writer, futures[-1][0], None)
+                    writer, buffer = None, buffer[end + 1:]
+        if writer is not None:
+            raise ValueError("API response ended inside an audio payload.")
+    finally:
+        # Always release an open writer, so a broken stream cannot leave its thread waiting.
+        # A writer that already died needs no release, and its error must not mask the stream's.
+        if writer is not None:
+            try: _feed(writer, futures[-1][0], None)
+            except Exception: pass
+    if not futures:
+        raise ValueError("API response did not contain predictions.")
+    paths = []
+    for future, local_path in futures:
+        if future.result() == 0: raise ValueError(f"Empty audio payload for {local_path.name}.")
+        paths.append(str(local_path))
+    return paths
+
+def _endpoint() -> str:
+    return f"https://{config.LOCATION}-aiplatform.googleapis.com/v1/projects/{config.PROJECT_ID}/locations/{config.LOCATION}/publishers/google/models/{MODELS['lyria'][0]}:predict"
+
+def _request_music(prompt: str, duration_seconds: int, output_paths: list, seed: int = None) -> list:
+    """One :predict call producing len(output_paths) samples, streamed to those paths."""
+    session = get_lyria_session()
+    instance = {"prompt": f"{prompt}, instrumental", "duration_seconds": duration_seconds}
+    # Lyria rejects a seed combined with sample_count.
+    if len(output_paths) == 1: instance["seed"] = int(time.time()) if seed is None else seed
+    payload = {"instances": [instance], "parameters": {"sample_count": len(output_paths)}}
+    def post():
+        with ThreadPoolExecutor(max_workers=len(output_paths)) as pool:
+            with session.post(_endpoint(), json=payload, timeout=LYRIA_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                return _stream_predictions(response, output_paths, pool)
+    return call_with_retry(MODELS['lyria'][0], post)
+
+# --- Long-form scores ---
+def _read_wav(path) -> tuple:
+    with wave.open(str(path), 'rb') as w:
+        params = w.getparams()
+        frames = w.readframes(params.nframes)
+    if params.sampwidth != 2: raise ValueError(f"Unsupported sample width {params.sampwidth} in {path}.")
+    samples = np.frombuffer(frames, dtype='<i2').astype(np.float32).reshape(-1, params.nchannels) / 32768.0
+    return samples, params
+
+def _rms_db(samples) -> float:
+    # Gate out near-silence so fades and pauses don't skew a segment's loudness.
+    frame_rms = np.sqrt(np.mean(samples ** 2, axis=1))
+    active = frame_rms[frame_rms > 1e-3]
+    return 20 * math.log10(float(np.sqrt(np.mean(active ** 2)))) if active.size else -120.0
+
+def stitch_segments(segment_paths: list, output_path, overlap_seconds: float, duration_seconds: float = None) -> str:
+    """
+    Joins WAV segments that overlap by overlap_seconds: each is gain-matched to the median loudness,
+    then neighbours are blended with an equal-power (sin/cos) crossfade. Writes a 16-bit WAV.
+    """
+    segments, params = [], None
+    for path in segment_paths:
+        samples, seg_params = _read_wav(path)
+        if params and (seg_params.framerate, seg_params.nchannels) != (params.framerate, params.nchannels):
+            raise ValueError(f"Segment {path} has a different format from the first segment.")
+        params = params or seg_params
+        segments.append(samples)
+
+    levels = [_rms_db(s) for s in segments]
+    target = float(np.median([l for l in levels if l > -120.0] or [0.0]))
+    segments = [s * 10 ** (max(-MAX_GAIN_DB, min(MAX_GAIN_DB, target - l)) / 20) if l > -120.0 else s for s, l in zip(segments, levels)]
+
+    overlap = int(overlap_seconds * params.framerate)
+    result = segments[0]
+    for seg in segments[1:]:
+        n = min(overlap, len(result), len(seg))
+        t = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+        blended = result[len(result) - n:] * np.cos(t * np.pi / 2) + seg[:n] * np.sin(t * np.pi / 2)
+        result = np.concatenate([result[:len(result) - n], blended, seg[n:]])
+    if duration_seconds:
+        result = result[:int(duration_seconds * params.framerate)]
+
+    pcm = (np.clip(result, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+    with wave.open(str(output_path), 'wb') as w:
+        w.setnchannels(params.nchannels); w.setsampwidth(2); w.setframerate(params.framerate)
+        w.writeframes(pcm)
+    return str(output_path)
+
+def _generate_segmented(prompt: str, output_path: str, duration_seconds: int, seed: int = None) -> str:
+    """Generates a long score as overlapping segments in parallel and stitches them."""
+    step = SEGMENT_SECONDS - SEGMENT_OVERLAP_SECONDS
+    count = math.ceil((duration_seconds - SEGMENT_OVERLAP_SECONDS) / step)
+    local_output = resolve_path_in_workspace(output_path)
+    # Segments live next to the output until the stitch succeeds, so a re-run reuses the ones already made.
+    segment_dir = local_output.with_name(f"{local_output.stem}_segments")
+    segment_dir.mkdir(parents=True, exist_ok=True)
+    plan_path = segment_dir / "segments.json"
+    plan = {"prompt": prompt, "duration_seconds": duration_seconds, "segment_seconds": SEGMENT_SECONDS, "overlap_seconds": SEGMENT_OVERLAP_SECONDS}
+    try:
+        previous = json.loads(plan_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        previous = {}
+    if seed is None and {k: previous.get(k) for k in plan} == plan:
+        seed = previous.get("base_seed")
+    base_seed = int(time.time()) if seed is None else seed
+    plan_path.write_text(json.dumps(dict(plan, base_seed=base_seed)), encoding='utf-8')
+    segment_paths = [segment_dir / f"segment_{i:02d}_{base_seed + i}.wav" for i in range(count)]
+    print(f" -> Long-form score: {count} segments of {SEGMENT_SECONDS}s with {SEGMENT_OVERLAP_SECONDS}s overlap.")
+
+    def make_segment(i: int):
+        # Each segment gets its own seed so neighbours vary instead of repeating.
+        tmp_path = segment_paths[i].with_suffix(".part")
+        _request_music(prompt, SEGMENT_SECONDS, [str(tmp_path)], seed=base_seed + i)
+        os.replace(tmp_path, segment_paths[i])
+
+    for attempt in range(1, SEGMENT_ATTEMPTS + 1):
+        pending = [i for i, path in enumerate(segment_paths) if not path.exists()]
+        if not pending: break
+        with ThreadPoolExecutor(max_workers=min(CONCURRENCY_LIMITS["lyria"], len(pending))) as pool:
+            futures = {i: pool.submit(make_segment, i) for i in pending}
+        failed = {i: f.exception() for i, f in futures.items() if f.exception()}
+        if failed:
+            print(f" -> Attempt {attempt}: {len(failed)}/{count} segment(s) failed ({next(iter(failed.values()))}); keeping the {count - len(failed)} finished.")
+    missing = [i for i, path in enumerate(segment_paths) if not path.exists()]
+    if missing:
+        raise RuntimeError(f"Segments {missing} failed after {SEGMENT_ATTEMPTS} attempts; finished segments are kept in {segment_dir}.")
+
+    stitch_segments(segment_paths, local_output, SEGMENT_OVERLAP_SECONDS, duration_seconds)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    return str(local_output)
+
+def generate_music(prompt: str, output_path: str, duration_seconds: int = 20, sample_count: int = 1, seed: int = None):
+    """
+    Generates instrumental music via the Lyria REST API. With sample_count > 1, variations are saved
+    next to output_path with numeric suffixes (music.wav, music_2.wav, ...). Returns the saved paths.
+    A single score longer than one segment (about 30s) is generated in overlapping parallel segments and crossfaded into a WAV.
+    """
     print(f"\n[Tool: generate_music]")
     try:
-        creds, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-        creds.refresh(google.auth.transport.requests.Request())
-        
-        api_endpoint = f"https://{config.LOCATION}-aiplatform.googleapis.com/v1/projects/{config.PROJECT_ID}/locations/{config.LOCATION}/publishers/google/models/{MODELS['lyria'][0]}:predict"
-        headers = {"Authorization": f"Bearer {creds.token}", "Content-Type": "application/json"}
-        
-        payload = {
-            "instances": [{"prompt": f"{prompt}, instrumental", "duration_seconds": duration_seconds, "seed": int(time.time())}],
-            "parameters": {"sample_count": 1}
-        }
-        
         print(f" -> Sending REST request to Lyria API for prompt: '{prompt}'")
-        response = requests.post(api_endpoint, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        response_data = response.json()
-        if 'predictions' not in response_data or not response_data['predictions']:
-            raise ValueError("API response did not contain predictions.")
-
-        b64_content = response_data['predictions'][0]['bytesBase64Encoded']
-        audio_bytes = base64.b64decode(b64_content)
-        
-        local_path = resolve_path_in_workspace(output_path)
-        local_path.write_bytes(audio_bytes)
-
-        print(f"✅ SUCCESS: Music saved to {local_path}")
-        return str(local_path)
+        if sample_count == 1 and duration_seconds > SEGMENT_SECONDS:
+            saved = [_generate_segmented(prompt, output_path, duration_seconds, seed)]
+        else:
+            saved = _request_music(prompt, duration_seconds, _sample_paths(output_path, sample_count), seed)
+
+        print(f"✅ SUCCESS: Music saved to {', '.join(saved)}")
+        return ", ".join(saved)
     except Exception as e:
         print(f"❌ FAILED: generate_music. Error: {e}")
         return None
@@ -47,7 +248,9 @@ def generate_music(prompt: str, output_path: str, duration_seconds: int = 20):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Lyria Music Generation")
     parser.add_argument("--prompt", required=True, help="Text prompt for music generation.")
-    parser.add_argument("--output_path", required=True, help="Local path to save the MP3 file.")
+    parser.add_argument("--output_path", required=True, help="Local path to save the audio file.")
     parser.add_argument("--duration", type=int, default=20, help="Duration of the music in seconds.")
+    parser.add_argument("--sample_count", type=int, default=1, help="Number of variations to generate.")
+    parser.add_argument("--seed", type=int, help="Base seed (long-form segments use seed, seed+1, ...).")
     args = parser.parse_args()
-    generate_music(args.prompt, args.output_path, args.duration)
\ No newline at end of file
+    generate_music(args.prompt, args.output_path, args.duration, args.sample_count, args.seed)
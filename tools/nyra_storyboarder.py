@@ -6,8 +6,8 @@ from typing import List, Optional, Literal
 
 # DEFINITIVE FIX: Added missing imports for the genai library, config, and helpers.
 from google import genai
-import config
-from ._helpers import resolve_path_in_workspace
+from ._helpers import resolve_path_in_workspace, get_genai_client
+from ._rate_limit import call_with_retry
 
 # --- Pydantic Schemas for a Detailed Production Plan ---
 
@@ -39,7 +39,7 @@ def create_production_plan(prompt: str, output_path: str) -> str:
     """
     print(f"\n[Tool: create_production_plan] for prompt: '{prompt}'")
     try:
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
+        gcp_client = get_genai_client()
 
         system_prompt = f"""
         You are an expert AI Film Director and Production Planner. Your task is to take a user's high-level film concept
@@ -67,7 +67,8 @@ def create_production_plan(prompt: str, output_path: str) -> str:
             response_schema=ProductionPlan,
         )
 
-        response = gcp_client.models.generate_content(
+        response = call_with_retry(
+            "gemini-2.5-pro", gcp_client.models.generate_content,
             model="gemini-2.5-pro",
             contents=full_prompt,
             config=gen_config
@@ -3,52 +3,72 @@
 import os
 import shutil
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import ffmpeg
 from pathlib import Path
 from ._helpers import resolve_path_in_workspace
 from . import _schema_helper
+from . import _video_assembly
+
+# frames_to_video: frames are decoded ahead on this many threads while ffmpeg encodes.
+FRAME_DECODE_WORKERS = min(16, os.cpu_count() or 4)
+FRAME_DECODE_AHEAD = FRAME_DECODE_WORKERS * 4
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
 
 # ... (All function definitions like list_files, save_text_file, compile_final_video, etc. remain unchanged) ...
 
 
 # DEFINITIVE FIX: The function is upgraded to accept a list of audio clips.
-def compile_final_video(video_clip_paths: list[str], audio_clip_paths: list[str], output_path: str) -> str:
+def compile_final_video(video_clip_paths: list[str], audio_clip_paths: list[str], output_path: str, encode_workers: int = None, transitions: list[str] = None) -> str:
     """
     Compiles multiple video clips and multiple audio tracks into a final movie using FFMPEG.
     The video and audio tracks are concatenated into single streams, respectively, before being combined.
+    When all clips share codec, resolution and timebase, the video is stream-copied and only the audio is encoded;
+    otherwise clips are re-encoded in parallel on encode_workers ffmpeg processes (config.VIDEO_ENCODE_WORKERS by default).
+    transitions[i] ('CUT' or 'FADE_TO_BLACK') is the transition after clip i; fades re-encode only the frames around each boundary.
     """
     print(f"\n[Tool: compile_final_video with FFMPEG]")
     try:
         # Resolve all input paths to be safe
-        resolved_video_clips = [ffmpeg.input(resolve_path_in_workspace(p).as_posix()) for p in video_clip_paths]
-        resolved_audio_clips = [ffmpeg.input(resolve_path_in_workspace(p).as_posix()) for p in audio_clip_paths]
+        resolved_video_clips = [resolve_path_in_workspace(p).as_posix() for p in video_clip_paths]
+        resolved_audio_clips = [resolve_path_in_workspace(p).as_posix() for p in audio_clip_paths]
         resolved_output = resolve_path_in_workspace(output_path).as_posix()
 
-        # Concatenate video and audio streams separately.
-        # v=1, a=0 means 1 video stream, 0 audio streams
-        concatenated_video = ffmpeg.concat(*resolved_video_clips, v=1, a=0)
-        # v=0, a=1 means 0 video streams, 1 audio stream
-        concatenated_audio = ffmpeg.concat(*[clip.audio for clip in resolved_audio_clips], v=0, a=1)
-
-        # Create the final output by explicitly mapping the concatenated video and audio.
-        # 'shortest' ensures the output terminates when the shorter of the two streams (video or audio) ends.
-        output_stream = ffmpeg.output(
-            concatenated_video,
-            concatenated_audio,
-            resolved_output,
-            vcodec='libx264',
-            acodec='aac',
-            shortest=None
-        )
+        probes = _video_assembly.probe_videos(resolved_video_clips)
+        fades = _video_assembly.clip_fades(transitions, probes)
+        fade_count = sum(1 for fade_in, _, _ in fades if fade_in)
+        if fade_count and _video_assembly.can_smart_render(probes):
+            print(f" -> {len(probes)} clips share codec/resolution/timebase; smart-rendering {fade_count} fade transition(s).")
+            stdout, stderr, reencoded = _video_assembly.concat_smart(resolved_video_clips, resolved_audio_clips, resolved_output, probes, fades, encode_workers)
+            mode = f"stream copy, {reencoded:.1f}s of {sum(p['duration'] for p in probes):.1f}s re-encoded for fades"
+            if not _video_assembly.decodes_cleanly(resolved_output):
+                # The spliced pieces' parameter sets did not agree with the MP4 sample entry.
+                workers = min(encode_workers or _video_assembly.ENCODE_WORKERS, len(resolved_video_clips))
+                print(f" -> Smart-rendered output failed the decode check; re-encoding on {workers} parallel encoder(s).")
+                stdout, stderr = _video_assembly.concat_segmented(resolved_video_clips, resolved_audio_clips, resolved_output, probes[0], workers, fades)
+                mode = f"re-encode after failed smart render, {workers} worker(s)"
+        elif _video_assembly.copy_compatible(probes) and not fade_count:
+            print(f" -> {len(probes)} clips share codec/resolution/timebase; stream-copying the video track.")
+            mode = "stream copy"
+            stdout, stderr = _video_assembly.concat_copy(resolved_video_clips, resolved_audio_clips, resolved_output)
+        else:
+            workers = min(encode_workers or _video_assembly.ENCODE_WORKERS, len(resolved_video_clips))
+            reason = "Fades need an H.264 profile/level libx264 cannot match" if _video_assembly.copy_compatible(probes) else "Clips differ in codec, resolution or timebase"
+            print(f" -> {reason}; re-encoding to {probes[0]['width']}x{probes[0]['height']} on {workers} parallel encoder(s).")
+            mode = f"re-encode, {workers} worker(s)"
+            if workers > 1:
+                stdout, stderr = _video_assembly.concat_segmented(resolved_video_clips, resolved_audio_clips, resolved_output, probes[0], workers, fades)
+            else:
+                stdout, stderr = _video_assembly.concat_reencode(resolved_video_clips, resolved_audio_clips, resolved_output, probes[0], fades)
 
         print("--- FFMPEG Command Log ---")
-        stdout, stderr = output_stream.run(capture_stdout=True, capture_stderr=True, overwrite_output=True)
         print("STDOUT:", stdout.decode('utf8'))
         print("STDERR:", stderr.decode('utf8'))
         print("--------------------------")
 
-        message = f"Final video with narration compiled successfully and saved to {resolved_output}"
+        message = f"Final video with narration compiled successfully ({mode}) and saved to {resolved_output}"
         print(f"✅ SUCCESS: {message}")
         return message
 
@@ -124,9 +144,21 @@ def make_directory(path: str) -> str:
     print(f"✅ SUCCESS: {message}")
     return message
 
-def frames_to_video(input_dir: str, output_path: str, fps: int = 24) -> str:
-    """Compiles a sequence of image frames into a video file and returns a confirmation."""
+def _read_frame(path: Path, size: tuple):
+    frame = cv2.imread(str(path))
+    if frame is None: raise ValueError(f"Could not decode frame '{path.name}'")
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+def frames_to_video(input_dir: str, output_path: str, fps: int = 24, crf: int = 18, preset: str = "medium") -> str:
+    """
+    Compiles a sequence of image frames into an H.264 video file and returns a confirmation.
+    Lower crf means higher quality (18 is visually lossless); preset trades encode speed for file size.
+    Frames whose size differs from the first are resized to match.
+    """
     print(f"\n[Tool: frames_to_video]")
+    if preset not in X264_PRESETS: raise ValueError(f"Unknown preset '{preset}'. Use one of: {', '.join(X264_PRESETS)}")
     frame_dir = resolve_path_in_workspace(input_dir)
     output_file = resolve_path_in_workspace(output_path)
     images = sorted([img for img in frame_dir.iterdir() if img.suffix.lower() in ['.png', '.jpg', '.jpeg']])
@@ -134,15 +166,41 @@ def frames_to_video(input_dir: str, output_path: str, fps: int = 24) -> str:
 
     frame = cv2.imread(str(images[0]))
     height, width, _ = frame.shape
-
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video = cv2.VideoWriter(str(output_file), fourcc, float(fps), (width, height))
-
-    for image in images:
-        video.write(cv2.imread(str(image)))
-
-    video.release()
-    message = f"Video compiled and saved to {output_file}"
+    # yuv420p needs even dimensions.
+    size = (width - width % 2, height - height % 2)
+
+    encoder = (
+        ffmpeg.input('pipe:', format='rawvideo', pix_fmt='bgr24', s=f"{size[0]}x{size[1]}", framerate=fps)
+        .output(str(output_file), vcodec='libx264', pix_fmt='yuv420p', crf=crf, preset=preset, movflags='+faststart')
+        .global_args('-loglevel', 'error')
+        .overwrite_output()
+        .run_async(pipe_stdin=True, pipe_stderr=True)
+    )
+    # Decoding runs ahead on a bounded pool; frames are handed to the single encoder stage in order.
+    try:
+        with ThreadPoolExecutor(max_workers=FRAME_DECODE_WORKERS) as pool:
+            pending = deque()
+            for image in images:
+                pending.append(pool.submit(_read_frame, image, size))
+                if len(pending) >= FRAME_DECODE_AHEAD:
+                    encoder.stdin.write(pending.popleft().result().tobytes())
+            while pending:
+                encoder.stdin.write(pending.popleft().result().tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its error is reported below.
+    except Exception:
+        encoder.kill()
+        raise
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+    stderr = encoder.stderr.read().decode('utf8', errors='replace')
+    if encoder.wait() != 0:
+        raise RuntimeError(f"FFMPEG encoding failed: {stderr.strip()}")
+
+    message = f"Video compiled and saved to {output_file} ({len(images)} frames, libx264 crf={crf}, preset={preset})"
     print(f"✅ SUCCESS: {message}")
     return message
 
@@ -155,3 +213,38 @@ def get_tool_declarations():
     return [_schema_helper.create_function_declaration(f) for f in _TOOL_FUNCTIONS]
 def get_tool_registry():
     return {f.__name__: f for f in _TOOL_FUNCTIONS}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Nyra System Tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    p_mkdir = subparsers.add_parser("mkdir", help="Create a directory in the workspace.")
+    p_mkdir.add_argument("path")
+    p_cp = subparsers.add_parser("cp", help="Copy a file or directory.")
+    p_cp.add_argument("source_path"); p_cp.add_argument("destination_path")
+    p_compile = subparsers.add_parser("compile", help="Compile clips and audio into a final video.")
+    p_compile.add_argument("--video_clips", nargs="+", required=True)
+    p_compile.add_argument("--audio_clips", nargs="*", default=[])
+    p_compile.add_argument("--output_path", required=True)
+    p_compile.add_argument("--encode_workers", type=int, help="Parallel encoders when re-encoding is needed.")
+    p_compile.add_argument("--transitions", nargs="*", choices=["CUT", "FADE_TO_BLACK"], help="Transition after each clip.")
+    p_bench = subparsers.add_parser("benchmark", help="Time filter-graph vs. segmented re-encoding of the given clips.")
+    p_bench.add_argument("--video_clips", nargs="+", required=True)
+    p_bench.add_argument("--audio_clips", nargs="*", default=[])
+    p_bench.add_argument("--output_dir", required=True)
+    p_bench.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    p_frames = subparsers.add_parser("frames2vid", help="Compile image frames into a video.")
+    p_frames.add_argument("--input_dir", required=True)
+    p_frames.add_argument("--output_path", required=True)
+    p_frames.add_argument("--fps", type=int, default=24)
+    p_frames.add_argument("--crf", type=int, default=18)
+    p_frames.add_argument("--preset", default="medium", choices=X264_PRESETS)
+    args = parser.parse_args()
+    if args.command == "mkdir": make_directory(args.path)
+    elif args.command == "cp": copy_file(args.source_path, args.destination_path)
+    elif args.command == "compile": compile_final_video(args.video_clips, args.audio_clips, args.output_path, args.encode_workers, args.transitions)
+    elif args.command == "benchmark":
+        results = _video_assembly.benchmark(
+            [resolve_path_in_workspace(p).as_posix() for p in args.video_clips], [resolve_path_in_workspace(p).as_posix() for p in args.audio_clips],
+            resolve_path_in_workspace(args.output_dir).as_posix(), args.workers)
+        for r in results: print(f"{r['mode']:>16}: {r['seconds']:7.2f}s  x{r['speedup']}")
+    elif args.command == "frames2vid": frames_to_video(args.input_dir, args.output_path, args.fps, args.crf, args.preset)
@@ -2,9 +2,9 @@
 import argparse
 import time
 from typing import Optional
-from google import genai
 from google.genai.types import GenerateVideosConfig, Video
-from ._helpers import download_from_gcs, handle_video_operation, upload_to_gcs, resolve_path_in_workspace
+from ._helpers import download_generated_videos, wait_for_video_operation, upload_to_gcs, resolve_path_in_workspace, get_genai_client
+from ._rate_limit import submit_with_retry
 from .models import MODELS
 import config
 
@@ -12,21 +12,22 @@ def extend_video(model_name: str, input_path: str, output_path: str, prompt: Opt
     """Extends a video clip by a few seconds."""
     print(f"\n[Tool: extend_video] with model '{model_name}'")
     try:
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
+        gcp_client = get_genai_client()
         gcs_uri = upload_to_gcs(resolve_path_in_workspace(input_path), "extend-inputs")
         output_gcs_prefix = f"video_outputs/{model_name}_extend/{int(time.time())}"
         output_gcs_uri = f"gs://{config.GCS_BUCKET_NAME}/{output_gcs_prefix}/"
         
         config_params = {"duration_seconds": 4, "output_gcs_uri": output_gcs_uri}
         
-        operation = gcp_client.models.generate_videos(
+        operation = submit_with_retry(
+            model_name, gcp_client.models.generate_videos,
             model=model_name,
             prompt=prompt or "",
             video=Video(uri=gcs_uri),
             config=GenerateVideosConfig(**config_params)
         )
-        final_gcs_uri = handle_video_operation(operation)
-        return download_from_gcs(final_gcs_uri, output_path)
+        final_gcs_uris = wait_for_video_operation(operation)
+        return ", ".join(download_generated_videos(final_gcs_uris, output_path))
     except Exception as e:
         print(f"❌ FAILED: extend_video. Error: {e}")
         return None
@@ -35,7 +36,7 @@ def inpaint_video(model_name: str, input_path: str, mask_path: str, output_path:
     """Inpaints a region of a video as defined by a mask video."""
     print(f"\n[Tool: inpaint_video] with model '{model_name}'")
     try:
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
+        gcp_client = get_genai_client()
         input_uri = upload_to_gcs(resolve_path_in_workspace(input_path), "inpaint-inputs")
         mask_uri = upload_to_gcs(resolve_path_in_workspace(mask_path), "inpaint-masks")
         output_gcs_prefix = f"video_outputs/{model_name}_inpaint/{int(time.time())}"
@@ -43,15 +44,16 @@ def inpaint_video(model_name: str, input_path: str, mask_path: str, output_path:
 
         config_params = {"mode": "INPAINT", "output_gcs_uri": output_gcs_uri}
 
-        operation = gcp_client.models.generate_videos(
+        operation = submit_with_retry(
+            model_name, gcp_client.models.generate_videos,
             model=model_name,
             prompt=prompt,
             video=Video(gcs_uri=input_uri),
             mask=Video(gcs_uri=mask_uri),
             config=GenerateVideosConfig(**config_params)
         )
-        final_gcs_uri = handle_video_operation(operation)
-        return download_from_gcs(final_gcs_uri, output_path)
+        final_gcs_uris = wait_for_video_operation(operation)
+        return ", ".join(download_generated_videos(final_gcs_uris, output_path))
     except Exception as e:
         print(f"❌ FAILED: inpaint_video. Error: {e}")
         return None
@@ -3,9 +3,11 @@
 import argparse
 import time
 from typing import Optional
-from google import genai
-from google.genai.types import GenerateVideosConfig, Image
-from ._helpers import download_from_gcs, handle_video_operation, upload_to_gcs, resolve_path_in_workspace
+from google.genai.types import GenerateVideosConfig
+from ._helpers import download_generated_videos, wait_for_video_operation, resolve_path_in_workspace, get_genai_client
+from ._image_transport import image_reference
+from .nyra_character_registry import character_image, with_character_prompt
+from ._rate_limit import submit_with_retry
 from .models import MODELS
 import config
 from . import _schema_helper
@@ -24,13 +26,14 @@ def generate_veo3_video(
     generate_audio: Optional[bool] = True,
     seed: Optional[int] = None,
     enhance_prompt: Optional[bool] = True,
-    person_generation: Optional[str] = "allow_adult"
+    person_generation: Optional[str] = "allow_adult",
+    character_id: Optional[str] = None
 ) -> str:
-    """Generates a video from text or an image using a Veo 3 model with full parameter control."""
+    """Generates a video from text or an image using a Veo 3 model with full parameter control. A registered character_id supplies the start image (unless image_path is given) and the character's identity prompt."""
     print(f"\n[Tool: generate_veo3_video] with model '{model_name}'")
     try:
         # DEFINITIVE FIX: Now uses config.PROJECT_ID and config.LOCATION.
-        gcp_client = genai.Client(vertexai=True, project=config.PROJECT_ID, location=config.LOCATION)
+        gcp_client = get_genai_client()
         
         if duration_seconds != 8:
             print(f"-> WARNING: Model {model_name} requires an 8-second duration. Overriding value.")
@@ -48,14 +51,16 @@ def generate_veo3_video(
         if "fast" in model_name: config_params["person_generation"] = person_generation
 
         api_kwargs = {"model": model_name, "config": GenerateVideosConfig(**config_params)}
+        if character_id: prompt = with_character_prompt(prompt, character_id)
         if prompt: api_kwargs["prompt"] = prompt
         if image_path:
-            gcs_uri = upload_to_gcs(resolve_path_in_workspace(image_path), "i2v-inputs")
-            api_kwargs["image"] = Image(gcs_uri=gcs_uri, mime_type="image/png")
+            api_kwargs["image"] = image_reference(resolve_path_in_workspace(image_path), "i2v-inputs", model_name=model_name)
+        elif character_id:
+            api_kwargs["image"] = character_image(character_id, model_name)
 
-        operation = gcp_client.models.generate_videos(**api_kwargs)
-        gcs_uri = handle_video_operation(operation)
-        return download_from_gcs(gcs_uri, output_path)
+        operation = submit_with_retry(model_name, gcp_client.models.generate_videos, **api_kwargs)
+        gcs_uris = wait_for_video_operation(operation)
+        return ", ".join(download_generated_videos(gcs_uris, output_path))
     except Exception as e: 
         return f"❌ FAILED: Veo 3 generation. Error: {e}"
 
@@ -78,6 +83,7 @@ if __name__ == '__main__':
     parser.add_argument("--seed", type=int)
     parser.add_argument("--enhance_prompt", type=bool, default=True)
     parser.add_argument("--person_generation", choices=["allow_adult", "disallow"], default="allow_adult")
+    parser.add_argument("--character_id")
     args = parser.parse_args()
-    if not args.prompt and not args.image_path: parser.error("Either --prompt or --image_path is required.")
+    if not args.prompt and not args.image_path and not args.character_id: parser.error("Either --prompt, --image_path or --character_id is required.")
     generate_veo3_video(**vars(args))
\ No newline at end of file
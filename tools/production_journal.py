@@ -0,0 +1,131 @@
+# tools/production_journal.py
+# Write-ahead journal of completed production nodes, one per project directory.
+# Every node appends a 'start' record before it runs and a 'done' record (input hash plus
+# SHA-256 and size of each output file) after it succeeds. On a resumed run, a node is skipped
+# when its latest 'done' record has the same input hash and its outputs are still intact, so a
+# crash at shot 9 does not pay for shots 1-8 again.
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Callable, Iterable, Optional
+from tools._helpers import resolve_path_in_workspace
+
+JOURNAL_FILENAME = "production_journal.jsonl"
+
+def file_checksum(path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def hash_inputs(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class ProductionJournal:
+    """
+    Append-only JSON-lines journal at <project_dir>/production_journal.jsonl.
+    Records are flushed and fsync'd one at a time, so a crash loses at most the node in flight.
+    """
+    def __init__(self, project_dir: str, resume: bool = True):
+        self.project_dir = project_dir
+        self.path = resolve_path_in_workspace(f"{project_dir}/{JOURNAL_FILENAME}")
+        self._lock = threading.Lock()
+        self.completed = {}
+        self.interrupted = set()
+        if resume:
+            self._replay()
+        elif self.path.exists():
+            # A fresh run keeps the previous journal next to the new one instead of deleting it.
+            os.replace(self.path, self.path.with_suffix(f".{int(time.time())}.jsonl"))
+
+    def _replay(self):
+        if not self.path.exists(): return
+        started = set()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A torn final line from a crash mid-write.
+                node_id = record.get('node_id')
+                if record.get('event') == 'start':
+                    started.add(node_id)
+                elif record.get('event') == 'done':
+                    started.discard(node_id)
+                    self.completed[node_id] = record
+                elif record.get('event') == 'failed':
+                    started.discard(node_id)
+                    self.completed.pop(node_id, None)
+        self.interrupted = started
+        print(f"-> Journal: {len(self.completed)} completed node(s) on record" + (f", {len(started)} interrupted: {sorted(started)}" if started else "") + ".")
+
+    def _append(self, record: dict):
+        record['ts'] = time.time()
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    # --- Node records ---
+    def input_hash(self, params: dict, deps: Iterable[str] = ()) -> str:
+        """Hashes a node's parameters together with the recorded outputs of its dependencies."""
+        dep_outputs = {dep: self.completed.get(dep, {}).get('outputs') for dep in deps}
+        return hash_inputs({"params": params, "deps": dep_outputs})
+
+    def is_valid(self, node_id: str, input_hash: str) -> bool:
+        """True if the node completed with these inputs and every recorded output is unchanged on disk."""
+        record = self.completed.get(node_id)
+        if not record or record.get('input_hash') != input_hash: return False
+        for rel_path, expected in record.get('outputs', {}).items():
+            path = resolve_path_in_workspace(rel_path)
+            if not path.exists() or path.stat().st_size != expected['size']: return False
+            if file_checksum(path) != expected['sha256']: return False
+        return True
+
+    def record_start(self, node_id: str, input_hash: str):
+        self._append({"event": "start", "node_id": node_id, "input_hash": input_hash})
+
+    def record_done(self, node_id: str, input_hash: str, output_paths: Iterable[str]):
+        outputs = {}
+        for rel_path in output_paths:
+            path = resolve_path_in_workspace(rel_path)
+            outputs[rel_path] = {"size": path.stat().st_size, "sha256": file_checksum(path)}
+        record = {"event": "done", "node_id": node_id, "input_hash": input_hash, "outputs": outputs}
+        self._append(record)
+        self.completed[node_id] = record
+
+    def record_failed(self, node_id: str, input_hash: str, error: Optional[str] = None):
+        self._append({"event": "failed", "node_id": node_id, "input_hash": input_hash, "error": error})
+        self.completed.pop(node_id, None)
+
+    def invalidate(self, node_ids: Iterable[str]):
+        """Forces the given nodes to run again on this pass (e.g. --from-shot)."""
+        for node_id in node_ids:
+            self.completed.pop(node_id, None)
+
+    # --- Scheduler integration ---
+    def wrap_runner(self, run_node: Callable) -> Callable:
+        """
+        Wraps a ProductionScheduler run_node coroutine: valid nodes are skipped, and every executed
+        node is journaled before it starts and after it finishes.
+        """
+        async def journaled_run_node(node) -> bool:
+            input_hash = self.input_hash(node.params, node.deps)
+            output_path = node.params['output_path']
+            if await asyncio.to_thread(self.is_valid, node.node_id, input_hash):
+                print(f"-> Journal: '{node.node_id}' is already complete, skipping.")
+                return True
+            self.record_start(node.node_id, input_hash)
+            ok = await run_node(node)
+            if ok and resolve_path_in_workspace(output_path).exists():
+                await asyncio.to_thread(self.record_done, node.node_id, input_hash, [output_path])
+                return True
+            self.record_failed(node.node_id, input_hash, f"output missing: {output_path}" if ok else "node reported failure")
+            return False
+        return journaled_run_node
@@ -0,0 +1,155 @@
+# tools/production_scheduler.py
+# Turns a ProductionPlan into a dependency graph and runs independent nodes concurrently.
+# Edges: EXTEND_SHOT base -> extension, and every shot clip + audio layer -> final compile.
+# Each node is bound to a resource (a model family or 'ffmpeg') with its own concurrency limit.
+# Nodes can be executed through LLM turns, or directly against the tool registry (make_direct_runner).
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from tools.models import CONCURRENCY_LIMITS
+from tools._helpers import resolve_path_in_workspace
+
+VEO_MODEL = "veo-2.0-generate-001"
+DEFAULT_VOICE = "hi-IN-Wavenet-D"
+EXTENSION_PROMPT = "the astronaut continues his journey across the landscape"
+
+class ProductionNode:
+    """A single unit of work in the production graph."""
+    def __init__(self, node_id: str, kind: str, resource: str, params: dict, deps: Optional[List[str]] = None):
+        self.node_id = node_id
+        self.kind = kind
+        self.resource = resource
+        self.params = params
+        self.deps = deps or []
+
+    def __repr__(self):
+        return f"ProductionNode({self.node_id}, deps={self.deps})"
+
+def build_production_graph(production_plan: dict, project_dir: str) -> List[ProductionNode]:
+    """
+    Builds the node list for a production plan. Node kinds are 'video', 'extend', 'audio' and 'compile'.
+    Nodes are returned in plan order, so a sequential walk of the list is also a valid schedule.
+    """
+    nodes = []
+    video_clips, audio_clips, compile_deps, transitions = [], [], [], []
+    for shot in production_plan['shots']:
+        shot_num = shot['shot_number']
+        output_clip_path = f"{project_dir}/shot_{shot_num:02d}.mp4"
+        common = {"shot_number": shot_num, "video_prompt": shot['video_prompt']}
+
+        if shot['generation_strategy'] == "EXTEND_SHOT":
+            base_clip_path = f"{project_dir}/shot_{shot_num:02d}_base.mp4"
+            base_id, extend_id = f"shot_{shot_num:02d}_base", f"shot_{shot_num:02d}"
+            nodes.append(ProductionNode(base_id, "video", "veo", dict(common, duration_seconds=8, output_path=base_clip_path, model_name=VEO_MODEL)))
+            nodes.append(ProductionNode(extend_id, "extend", "veo", dict(common, input_path=base_clip_path, output_path=output_clip_path, prompt=EXTENSION_PROMPT, model_name=VEO_MODEL), deps=[base_id]))
+            compile_deps.append(extend_id)
+        else:
+            # FRAMES_TO_VIDEO has no frame source in the plan, so it is rendered as a single Veo shot.
+            node_id = f"shot_{shot_num:02d}"
+            nodes.append(ProductionNode(node_id, "video", "veo", dict(common, duration_seconds=min(shot['duration_seconds'], 8), output_path=output_clip_path, model_name=VEO_MODEL)))
+            compile_deps.append(node_id)
+        video_clips.append(output_clip_path)
+        transitions.append(shot.get('transition_to_next') or "CUT")
+
+        for i, layer in enumerate(shot['audio_layers']):
+            layer_type = layer['layer_type']
+            audio_path = f"{project_dir}/shot_{shot_num:02d}_audio_{i+1}_{layer_type.lower()}.mp3"
+            node_id = f"shot_{shot_num:02d}_audio_{i+1}"
+            resource = "chirp" if layer_type == "DIALOGUE" else "lyria"
+            params = {"shot_number": shot_num, "layer_type": layer_type, "prompt": layer['prompt'], "output_path": audio_path, "duration_seconds": shot['duration_seconds']}
+            if layer_type == "DIALOGUE": params["voice_name"] = layer.get('voice_name') or DEFAULT_VOICE
+            nodes.append(ProductionNode(node_id, "audio", resource, params))
+            compile_deps.append(node_id)
+            audio_clips.append(audio_path)
+
+    if video_clips:
+        nodes.append(ProductionNode("compile", "compile", "ffmpeg", {
+            "video_clip_paths": video_clips, "audio_clip_paths": audio_clips, "transitions": transitions,
+            "output_path": f"{project_dir}/final_film.mp4"
+        }, deps=compile_deps))
+    return nodes
+
+class ProductionScheduler:
+    """
+    Runs a production graph with asyncio. `run_node` is an async callable that executes one node
+    and returns True on success. A failed node skips everything downstream of it; independent
+    branches keep running so paid-for work is not thrown away.
+    """
+    def __init__(self, nodes: List[ProductionNode], run_node: Callable, concurrency_limits: Optional[Dict[str, int]] = None):
+        self.nodes = {node.node_id: node for node in nodes}
+        self.run_node = run_node
+        limits = dict(CONCURRENCY_LIMITS, **(concurrency_limits or {}))
+        self._semaphores = {resource: asyncio.Semaphore(limit) for resource, limit in limits.items()}
+        self.status = {node_id: "pending" for node_id in self.nodes}
+        for node in nodes:
+            missing = [d for d in node.deps if d not in self.nodes]
+            if missing: raise ValueError(f"Node '{node.node_id}' depends on unknown nodes: {missing}")
+
+    def _semaphore(self, resource: str) -> asyncio.Semaphore:
+        if resource not in self._semaphores:
+            self._semaphores[resource] = asyncio.Semaphore(1)
+        return self._semaphores[resource]
+
+    async def _run(self, node: ProductionNode, tasks: dict):
+        for dep in node.deps:
+            await tasks[dep]
+        failed_deps = [d for d in node.deps if self.status[d] != "done"]
+        if failed_deps:
+            self.status[node.node_id] = "skipped"
+            print(f"-> Skipping '{node.node_id}': upstream nodes did not complete {failed_deps}")
+            return
+        async with self._semaphore(node.resource):
+            self.status[node.node_id] = "running"
+            try:
+                ok = await self.run_node(node)
+            except Exception as e:
+                print(f"\033[91m[SCHEDULER] > Node '{node.node_id}' raised: {e}\033[0m")
+                ok = False
+        self.status[node.node_id] = "done" if ok else "failed"
+
+    async def run_async(self) -> dict:
+        """Runs every node as soon as its dependencies finish. Returns the final status of each node."""
+        tasks = {}
+        for node_id, node in self.nodes.items():
+            tasks[node_id] = asyncio.ensure_future(self._run(node, tasks))
+        await asyncio.gather(*tasks.values())
+        return dict(self.status)
+
+def node_tool_call(node: ProductionNode):
+    """Maps a production node straight to its tool name and keyword arguments."""
+    p = node.params
+    if node.kind == "video":
+        return "generate_veo2_video", {"model_name": p['model_name'], "output_path": p['output_path'], "prompt": p['video_prompt'], "duration_seconds": p['duration_seconds']}
+    if node.kind == "extend":
+        return "extend_video", {"model_name": p['model_name'], "input_path": p['input_path'], "output_path": p['output_path'], "prompt": p['prompt']}
+    if node.kind == "audio" and p['layer_type'] == "DIALOGUE":
+        return "generate_speech", {"text_to_speak": p['prompt'], "output_path": p['output_path'], "voice_name": p['voice_name']}
+    if node.kind == "audio":
+        return "generate_music", {"prompt": p['prompt'], "output_path": p['output_path'], "duration_seconds": p['duration_seconds']}
+    if node.kind == "compile":
+        return "compile_final_video", {"video_clip_paths": p['video_clip_paths'], "audio_clip_paths": p['audio_clip_paths'], "output_path": p['output_path'], "transitions": p.get('transitions')}
+    raise ValueError(f"Unknown node kind '{node.kind}' for node '{node.node_id}'")
+
+def make_direct_runner(tool_registry: dict, concurrency_limits: Optional[Dict[str, int]] = None) -> Callable:
+    """
+    Returns a run_node coroutine for ProductionScheduler that calls the tools directly,
+    with no LLM round trip per node. The blocking tools run on a dedicated thread pool with one
+    thread per concurrency slot, so Veo nodes waiting minutes on their operations never hold the
+    threads that Chirp or Lyria nodes need (the loop's default executor is far smaller).
+    A node succeeds only when its tool returned a result and wrote the node's output_path; the
+    output is removed first, so a file left by an earlier run never counts.
+    """
+    limits = dict(CONCURRENCY_LIMITS, **(concurrency_limits or {}))
+    executor = ThreadPoolExecutor(max_workers=sum(limits.values()), thread_name_prefix="production_node")
+
+    async def run_node(node: ProductionNode) -> bool:
+        tool_name, tool_args = node_tool_call(node)
+        print(f"\033[93m[EXECUTOR] > {node.node_id}: {tool_name}\033[0m")
+        output_path = resolve_path_in_workspace(node.params['output_path'])
+        output_path.unlink(missing_ok=True)
+        call = functools.partial(tool_registry[tool_name], **tool_args)
+        result = await asyncio.get_running_loop().run_in_executor(executor, call)
+        print(f"\033[94m[TOOL RESULT] > {node.node_id}: {result}\033[0m")
+        return result is not None and output_path.exists()
+    return run_node
@@ -1,26 +1,18 @@
 # tools/tool_loader.py
-import os
-import importlib
-from google.genai.types import Tool
+from google.genai.types import Tool, FunctionDeclaration
+from tools._tool_manifest import build_tools, discover_registered_tools
 
 def load_all_tools():
     """
-    Dynamically scans the 'tools' directory, imports modules starting with 'nyra_',
-    and aggregates their schemas and function registries.
+    Scans the 'tools' directory for 'nyra_' modules that declare a `_TOOL_FUNCTIONS` list and
+    aggregates their schemas and function registries. Schemas come from the cached tool manifest
+    and the registry holds lazy proxies, so no tool module is imported until its tool is called.
     """
-    all_function_declarations = []
-    tool_registry = {}
-    tools_dir = os.path.dirname(__file__)
-    for filename in os.listdir(tools_dir):
-        if filename.startswith('nyra_') and filename.endswith('.py'):
-            module_name = f"tools.{filename[:-3]}"
-            try:
-                module = importlib.import_module(module_name)
-                if hasattr(module, 'get_tool_declarations') and hasattr(module, 'get_tool_registry'):
-                    all_function_declarations.extend(module.get_tool_declarations())
-                    tool_registry.update(module.get_tool_registry())
-            except Exception as e:
-                print(f"Warning: Could not load tools from {module_name}. Error: {e}")
-    return Tool(function_declarations=all_function_declarations), tool_registry
+    try:
+        declarations, tool_registry = build_tools(discover_registered_tools())
+    except Exception as e:
+        print(f"Warning: Could not build the tool manifest. Error: {e}")
+        declarations, tool_registry = [], {}
+    return Tool(function_declarations=[FunctionDeclaration(**d) for d in declarations]), tool_registry
 
-ALL_TOOLS_SCHEMA, TOOL_REGISTRY = load_all_tools()
\ No newline at end of file
+ALL_TOOLS_SCHEMA, TOOL_REGISTRY = load_all_tools()